@@ -1,20 +1,28 @@
 import os
+import json
+import mimetypes
 import sys
 import time
-import platform
-import requests
-import uuid
+import threading
+import multiprocessing
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import WebDriverException
-from flask import Flask, request, render_template, send_file, jsonify
+from fb_core import (
+    AdmissionController, BrowserSupervisor, ImageStore, JobManager, NegativeCache, Overloaded,
+    ResultCache, ResultTokens, SingleFlight, download_to_store, driver_pool, extraction_engine,
+    memory_governor, normalize_photo_url, process_reaper, start_warm_up
+)
+from fb_core.config import (
+    ADMISSION_QUEUE_LIMIT, BROWSER_SLOTS, BROWSER_WORKER_JOB_TIMEOUT, BROWSER_WORKERS,
+    DOWNLOAD_WAIT_TIMEOUT, JOB_CLIENT_CONCURRENCY,
+    JOB_CLIENT_PENDING, JOB_RESULT_TTL, JOB_WORKERS, NEGATIVE_CACHE_ENTRIES, NEGATIVE_CACHE_TTLS,
+    RESULT_CACHE_DISK_ENTRIES, RESULT_CACHE_MEMORY_ENTRIES, RESULT_CACHE_TTL,
+    RESULT_TOKEN_TTL, SECRET_KEY, SSE_MAX_STREAMS
+)
+from flask import Flask, Response, request, render_template, send_file, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
 
 # Set up logging
@@ -22,6 +30,8 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# Render's proxy appends the caller's address to X-Forwarded-For; trust only that hop
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 CORS(app)
 
 # Configure downloads directory
@@ -29,257 +39,118 @@ DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "downlo
 if not os.path.exists(DOWNLOADS_DIR):
     os.makedirs(DOWNLOADS_DIR)
 
-# Global variable to store the last downloaded file path
-last_downloaded_file = None
+# Images are stored once per content hash, so concurrent downloads never overwrite each other
+image_store = ImageStore(os.path.join(DOWNLOADS_DIR, "store"))
 
-def get_chrome_options():
-    """Get Chrome options configured for Render environment"""
-    import subprocess
-    from pathlib import Path
-    
-    # Try to load environment variables from file if on Render
-    if os.environ.get('RENDER'):
-        env_file = Path.home() / '.chrome_env'
-        if env_file.exists():
-            logger.info(f"Loading environment from {env_file}")
-            with open(env_file) as f:
-                for line in f:
-                    if line.startswith('export '):
-                        line = line.replace('export ', '')
-                        key, value = line.strip().split('=', 1)
-                        os.environ[key] = value
-                        logger.info(f"Loaded {key}={value}")
-    
-    # Log environment information
-    logger.info("="*50)
-    logger.info("Chrome Detection Starting...")
-    logger.info(f"Environment variables:")
-    logger.info(f"CHROME_BIN: {os.environ.get('CHROME_BIN', 'Not set')}")
-    logger.info(f"PATH: {os.environ.get('PATH', 'Not set')}")
-    logger.info(f"HOME: {os.environ.get('HOME', 'Not set')}")
-    
-    # Check if CHROME_BIN is set and points to an existing file
-    chrome_bin = os.environ.get('CHROME_BIN')
-    if not chrome_bin or not os.path.exists(chrome_bin):
-        logger.warning(f"CHROME_BIN not set or does not exist: {chrome_bin}")
-        # Try common locations
-        common_paths = [
-            "/usr/bin/google-chrome-stable",
-            "/usr/bin/google-chrome",
-            "/usr/bin/chromium-browser",
-            "/usr/bin/chromium"
-        ]
-        
-        chrome_found = False
-        for path in common_paths:
-            if os.path.exists(path):
-                chrome_bin = path
-                os.environ['CHROME_BIN'] = path
-                logger.info(f"Found Chrome at: {path}")
-                chrome_found = True
-                break
-        
-        if not chrome_found:
-            # Try to find Chrome using which command
-            import shutil
-            for browser in ['google-chrome-stable', 'google-chrome', 'chromium-browser', 'chromium']:
-                path = shutil.which(browser)
-                if path:
-                    chrome_bin = path
-                    os.environ['CHROME_BIN'] = path
-                    logger.info(f"Found Chrome in PATH: {path}")
-                    chrome_found = True
-                    break
-            
-            if not chrome_found:
-                logger.error("Chrome not found in any location!")
-                logger.error(f"Common paths checked: {common_paths}")
-                raise FileNotFoundError("Chrome browser is not installed. Please ensure Chrome is installed via build.sh")
-    
-    logger.info(f"Using Chrome binary: {chrome_bin}")
-    
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")  # Use new headless mode
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")  # Already present for sandbox issues
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-setuid-sandbox")  # Already present for sandbox issues
-    chrome_options.add_argument("--single-process")
-    chrome_options.add_argument("--disable-dev-tools")
-    chrome_options.add_argument("--no-zygote")
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("--disable-web-security")
-    chrome_options.add_argument("--disable-features=VizDisplayCompositor")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--disable-software-rasterizer")
-    chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--disable-background-timer-throttling")
-    chrome_options.add_argument("--disable-backgrounding-occluded-windows")
-    chrome_options.add_argument("--disable-renderer-backgrounding")
-    chrome_options.add_argument("--disable-ipc-flooding-protection")
-    chrome_options.add_argument("--disable-logging")
-    chrome_options.add_argument("--disable-breakpad")
-    chrome_options.add_argument("--disable-component-update")
-    chrome_options.add_argument("--disable-default-apps")
-    chrome_options.add_argument("--disable-domain-reliability")
-    chrome_options.add_argument("--disable-sync")
-    chrome_options.add_argument("--disable-translate")
-    chrome_options.add_argument("--metrics-recording-only")
-    chrome_options.add_argument("--no-first-run")
-    chrome_options.add_argument("--safebrowsing-disable-auto-update")
-    chrome_options.add_argument("--ignore-certificate-errors")
-    chrome_options.add_argument("--ignore-ssl-errors")
-    chrome_options.add_argument("--ignore-certificate-errors-spki-list")
-    chrome_options.add_argument("--disable-features=TranslateUI")
-    chrome_options.add_argument("--disable-features=ProcessPerSiteUpToMainFrameThreshold")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+# Repeat requests for the same photo are answered from here without launching Chrome
+result_cache = ResultCache(
+    image_store,
+    os.path.join(DOWNLOADS_DIR, "results"),
+    ttl=RESULT_CACHE_TTL,
+    max_entries=RESULT_CACHE_MEMORY_ENTRIES,
+    max_disk_entries=RESULT_CACHE_DISK_ENTRIES
+)
+
+# Private, deleted and otherwise failing photos fail fast for a cause-specific TTL
+negative_cache = NegativeCache(NEGATIVE_CACHE_TTLS, NEGATIVE_CACHE_ENTRIES)
+
+# Concurrent requests for the same photo share a single browser run
+download_flights = SingleFlight()
+
+# With BROWSER_WORKERS set, each Chrome lives in its own supervised process so a
+# crash or hang only costs a restart; otherwise the in-process driver pool is used
+browser_supervisor = BrowserSupervisor(BROWSER_WORKERS, job_timeout=BROWSER_WORKER_JOB_TIMEOUT) if BROWSER_WORKERS else None
+
+def run_download_job(url, progress=None):
+    """Job handler: the store record for url, sharing caches and in-flight work between jobs"""
+    return download_to_store(
+        url, image_store,
+        cache=result_cache,
+        negative_cache=negative_cache,
+        flights=download_flights,
+        progress=progress,
+        engine=browser_supervisor
+    )
+
+# At most one download per live browser plus a short queue, and only one near the
+# memory limit; the rest are told when to retry
+admission = AdmissionController(
+    slots=BROWSER_SLOTS,
+    queue_limit=ADMISSION_QUEUE_LIMIT,
+    memory=memory_governor,
+    capacity=browser_supervisor.capacity if browser_supervisor else driver_pool.capacity
+)
+
+# Browser work runs on these workers, taking clients in turn; HTTP threads only submit and poll
+job_manager = JobManager(
+    run_download_job,
+    workers=JOB_WORKERS,
+    result_ttl=JOB_RESULT_TTL,
+    admission=admission,
+    client_concurrency=JOB_CLIENT_CONCURRENCY,
+    client_pending=JOB_CLIENT_PENDING
+)
+
+# Open progress streams, each holding one web thread until its job ends
+event_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+# Each download gets its own expiring handle, so concurrent users never see each other's images
+result_tokens = ResultTokens(image_store, SECRET_KEY, max_age=RESULT_TOKEN_TTL)
+
+# Discover Chrome and pre-launch the browsers in the background at startup (not in
+# the worker processes, which re-import this module when started with python app.py);
+# the reaper cleans up after sessions that die without quitting
+if multiprocessing.parent_process() is None:
+    process_reaper.start()
+    if browser_supervisor:
+        browser_supervisor.start()
+    else:
+        start_warm_up()
+
+def client_key():
+    """Key requests are scheduled fairly by: the caller's IP, as seen by Render's proxy"""
+    # ProxyFix set this from the hop the proxy added, which clients cannot choose
+    return request.remote_addr
+
+def cached_job(url, client=None):
+    """
+    Answer url from the result or negative cache in the request thread.
     
-    # Set the binary location
-    chrome_options.binary_location = chrome_bin
+    Hits never touch the job queue or admission control, so they come back in
+    milliseconds even while every browser is busy.
     
-    # Verify Chrome can be executed
-    try:
-        result = subprocess.run([chrome_bin, '--version'], capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            logger.info(f"Chrome version: {result.stdout.strip()}")
-        else:
-            logger.warning(f"Could not get Chrome version: {result.stderr}")
-    except Exception as e:
-        logger.warning(f"Could not get Chrome version: {e}")
+    Returns:
+        Job: A finished job for a cache hit, or None on a miss.
     
-    logger.info("="*50)
-    return chrome_options
-
-def get_chrome_driver():
-    """Get Chrome driver configured for Render environment with proper error handling"""
-    try:
-        # Get Chrome options
-        chrome_options = get_chrome_options()
-        
-        # Try to get ChromeDriver path from environment
-        chromedriver_path = os.environ.get('CHROMEDRIVER_PATH')
-        
-        # If not set, try common locations
-        if not chromedriver_path or not os.path.exists(chromedriver_path):
-            common_paths = [
-                '/usr/local/bin/chromedriver',
-                '/usr/bin/chromedriver'
-            ]
-            
-            for path in common_paths:
-                if os.path.exists(path):
-                    chromedriver_path = path
-                    break
-        
-        # If we have a valid ChromeDriver path, use it
-        if chromedriver_path and os.path.exists(chromedriver_path):
-            try:
-                logger.info(f"Initializing ChromeDriver from: {chromedriver_path}")
-                service = Service(chromedriver_path)
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-                logger.info("ChromeDriver initialized successfully")
-                return driver
-            except Exception as e:
-                logger.warning(f"Failed to initialize ChromeDriver from {chromedriver_path}: {str(e)}")
-        
-        # If we're not on Render (local development), try webdriver-manager
-        if not os.environ.get('RENDER'):
-            try:
-                from webdriver_manager.chrome import ChromeDriverManager
-                logger.info("Attempting to use webdriver-manager for ChromeDriver (local development)")
-                os.environ['WDM_LOG'] = '0'  # Disable webdriver-manager logging
-                driver_path = ChromeDriverManager().install()
-                service = Service(driver_path)
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-                logger.info("ChromeDriver initialized successfully with webdriver-manager")
-                return driver
-            except Exception as e:
-                logger.warning(f"Failed to initialize ChromeDriver with webdriver-manager: {str(e)}")
-        
-        # Last resort: try without explicit service
-        try:
-            logger.info("Attempting to initialize ChromeDriver without explicit path")
-            driver = webdriver.Chrome(options=chrome_options)
-            logger.info("ChromeDriver initialized successfully without explicit path")
-            return driver
-        except Exception as e:
-            logger.error(f"Failed to initialize ChromeDriver: {str(e)}")
-            raise RuntimeError(f"Unable to initialize ChromeDriver. Error: {str(e)}")
-            
-    except Exception as e:
-        logger.error(f"Error in get_chrome_driver(): {str(e)}")
-        raise
+    Raises:
+        ValueError: If url cannot be parsed.
+    """
+    key, _ = normalize_photo_url(url)
+    record = result_cache.get(key)
+    if record:
+        return job_manager.resolved(url, client, result=record)
+    failure = negative_cache.get(key)
+    if failure:
+        return job_manager.resolved(url, client, failure=failure)
+    return None
 
-def download_facebook_profile_picture(url):
+def download_facebook_profile_picture(url, client=None):
     """
-    Download a Facebook profile picture using Selenium in headless mode.
+    Download a Facebook profile picture through the fair job queue and wait for it.
     
     Args:
         url (str): The Facebook photo URL.
+        client (str): Key of the requesting client.
     
     Returns:
-        str: Path to the downloaded image or None if failed.
-    """
+        Job: The finished job, or the still pending one after DOWNLOAD_WAIT_TIMEOUT.
     
-    driver = None
-    try:
-        driver = get_chrome_driver()
-        driver.set_page_load_timeout(30)
-        
-        logger.info(f"Opening URL: {url}")
-        driver.get(url)
-        
-        # Wait for the page to load
-        time.sleep(2)
-        
-        # Press ESC key to exit photo viewer
-        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
-        
-        # Wait a moment for the page to adjust
-        time.sleep(2)
-
-        profile_img_url = None
-        try:
-            # Wait for image element
-            wait = WebDriverWait(driver, 10)
-            img_element = wait.until(EC.visibility_of_element_located((By.XPATH, "//img[@data-visualcompletion='media-vc-image'] | //img[contains(@class, 'i09qtzwb')] ")))
-            profile_img_url = img_element.get_attribute('src')
-
-        except Exception as e:
-            logger.warning(f"Primary image selector failed. {e}")
-
-        if profile_img_url:
-            logger.info(f"Downloading image from: {profile_img_url}")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            img_response = requests.get(profile_img_url, headers=headers)
-            
-            if img_response.status_code == 200:
-                # Use a fixed filename as requested
-                filename = "Free_FB_Zone_Profile_Picture.png"
-                filepath = os.path.join(DOWNLOADS_DIR, filename)
-                
-                with open(filepath, "wb") as f:
-                    f.write(img_response.content)
-                
-                return filepath
-            else:
-                logger.error(f"Failed to download image. Status code: {img_response.status_code}")
-                return None
-        else:
-            logger.error("Could not find profile image URL.")
-            return None
-            
-    except WebDriverException as e:
-        logger.error(f"WebDriver error: {str(e)}")
-        return None
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {e}")
-        return None
-    finally:
-        if driver:
-            driver.quit()
+    Raises:
+        Overloaded: If the client or the server has too much work queued.
+    """
+    job = cached_job(url, client) or job_manager.submit(url, client)
+    job.done.wait(DOWNLOAD_WAIT_TIMEOUT)
+    return job
 
 @app.route('/')
 def index():
@@ -408,11 +279,20 @@ def index():
                 
                 // Disable button and show loading
                 downloadBtn.disabled = true;
+                loadingText.textContent = 'Downloading profile picture... This may take a few seconds.';
                 loading.style.display = 'block';
                 result.style.display = 'none';
                 
-                // Send request to server
-                fetch('/download', {
+                function showResult(className, html) {
+                    loading.style.display = 'none';
+                    result.className = className;
+                    result.innerHTML = html;
+                    result.style.display = 'block';
+                    downloadBtn.disabled = false;
+                }
+                
+                // Queue the download, then follow its progress over one Server-Sent Events stream
+                fetch('/jobs', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -421,36 +301,100 @@ def index():
                 })
                 .then(response => response.json())
                 .then(data => {
-                    loading.style.display = 'none';
-                    if (data.success) {
-                        result.className = 'result success';
-                        result.innerHTML = `
+                    if (!data.success) {
+                        showResult('result error', `<h3>Download Failed</h3><p>${data.error}</p>`);
+                        return;
+                    }
+                    const finish = done => {
+                        downloadExtension = IMAGE_EXTENSIONS[done.content_type] || '.png';
+                        // Fetch the image as soon as the job is done, as inline /download would have
+                        // returned it, so the button saves it without another request
+                        loadingText.textContent = PHASE_MESSAGES.stored;
+                        fetch(done.result_url)
+                        .then(response => response.ok ? response.blob() : Promise.reject())
+                        .then(blob => {
+                            if (downloadUrl && downloadUrl.startsWith('blob:')) {
+                                URL.revokeObjectURL(downloadUrl);
+                            }
+                            downloadUrl = URL.createObjectURL(blob);
+                        }, () => {
+                            downloadUrl = done.result_url;
+                        })
+                        .then(() => showResult('result success', `
                             <h3>Download Successful!</h3>
                             <p>Profile picture downloaded successfully.</p>
                             <button onclick="downloadImage()" style="margin-top: 10px; padding: 10px 15px; background-color: #28a745; color: white; border: none; border-radius: 5px; cursor: pointer;">Download Image</button>
-                        `;
-                    } else {
-                        result.className = 'result error';
-                        result.innerHTML = `<h3>Download Failed</h3><p>${data.error}</p>`;
-                    }
-                    result.style.display = 'block';
+                        `));
+                    };
+                    const fail = error => {
+                        showResult('result error', `<h3>Download Failed</h3><p>${error}</p>`);
+                    };
+                    // Without a stream (the server is at its stream limit, or the connection dropped)
+                    // poll the job's status instead
+                    const poll = () => {
+                        fetch(`/jobs/${data.job_id}`)
+                        .then(response => response.ok ? response.json() : Promise.reject())
+                        .then(job => {
+                            if (job.status === 'done') {
+                                finish(job);
+                            } else if (job.status === 'failed') {
+                                fail(job.error);
+                            } else {
+                                if (PHASE_MESSAGES[job.phase]) {
+                                    loadingText.textContent = PHASE_MESSAGES[job.phase];
+                                }
+                                setTimeout(poll, 1500);
+                            }
+                        })
+                        .catch(() => {
+                            showResult('result error', '<h3>Error</h3><p>Lost connection to the server.</p>');
+                        });
+                    };
+                    const events = new EventSource(`/jobs/${data.job_id}/events`);
+                    PHASES.forEach(phase => events.addEventListener(phase, event => {
+                        loadingText.textContent = PHASE_MESSAGES[phase];
+                    }));
+                    events.addEventListener('done', event => {
+                        events.close();
+                        finish(JSON.parse(event.data));
+                    });
+                    events.addEventListener('failed', event => {
+                        events.close();
+                        fail(JSON.parse(event.data).error);
+                    });
+                    events.onerror = () => {
+                        events.close();
+                        poll();
+                    };
                 })
                 .catch(error => {
-                    loading.style.display = 'none';
-                    result.className = 'result error';
-                    result.innerHTML = `<h3>Error</h3><p>An unexpected error occurred: ${error.message}</p>`;
-                    result.style.display = 'block';
-                })
-                .finally(() => {
-                    downloadBtn.disabled = false;
+                    showResult('result error', `<h3>Error</h3><p>An unexpected error occurred: ${error.message}</p>`);
                 });
             });
             
+            const loadingText = document.querySelector('#loading p');
+            const PHASES = ['queued', 'running', 'cache_hit', 'browser_acquired', 'navigated', 'located', 'fetched', 'stored'];
+            const PHASE_MESSAGES = {
+                queued: 'Waiting for a free browser...',
+                running: 'Starting download...',
+                cache_hit: 'Found a recent copy...',
+                browser_acquired: 'Opening the photo page...',
+                navigated: 'Looking for the profile picture...',
+                located: 'Found it! Downloading the image...',
+                fetched: 'Saving the image...',
+                stored: 'Almost done...'
+            };
+            
+            // Link to the image from the last successful download on this page
+            let downloadUrl = null;
+            let downloadExtension = '.png';
+            const IMAGE_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif', 'image/webp': '.webp'};
+            
             function downloadImage() {
                 // Create a temporary link and trigger download
                 const link = document.createElement('a');
-                link.href = '/download_file';
-                link.download = 'Free_FB_Zone_Profile_Picture.png';
+                link.href = downloadUrl;
+                link.download = 'Free_FB_Zone_Profile_Picture' + downloadExtension;
                 document.body.appendChild(link);
                 link.click();
                 document.body.removeChild(link);
@@ -462,7 +406,6 @@ def index():
 
 @app.route('/download', methods=['POST'])
 def download():
-    global last_downloaded_file
     try:
         data = request.get_json()
         url = data.get('url', '').strip()
@@ -471,20 +414,47 @@ def download():
             return jsonify({'success': False, 'error': 'No URL provided'}), 400
         
         # Download the profile picture
-        filepath = download_facebook_profile_picture(url)
+        job = download_facebook_profile_picture(url, client_key())
         
-        if filepath and os.path.exists(filepath):
-            # Store the file path for later download
-            last_downloaded_file = filepath
+        if job.status == 'done':
+            record = job.result
+            # Inline mode: the image is the response body, so no /download_file round trip
+            if data.get('inline') or request.args.get('inline') == '1':
+                response = send_image(image_store.absolute_path(record))
+                response.headers['Cache-Control'] = 'private, max-age=0'
+                return response
+            
+            token = result_tokens.issue(record)
             return jsonify({
-                'success': True
+                'success': True,
+                'token': token,
+                'download_url': f'/download_file/{token}'
             })
-        else:
+        elif job.status == 'failed':
+            if job.cause == 'error':
+                return jsonify({
+                    'success': False,
+                    'error': 'Failed to download profile picture. The photo might be private or unavailable.'
+                }), 400
             return jsonify({
                 'success': False,
-                'error': 'Failed to download profile picture. The photo might be private or unavailable.'
+                'error': job.error,
+                'cause': job.cause,
+                'cached': job.cached
             }), 400
-            
+        else:
+            # Still queued or running: hand over the job instead of holding the thread any longer
+            return jsonify({
+                'success': False,
+                'error': 'The download is taking longer than usual.',
+                'job_id': job.id,
+                'status_url': f'/jobs/{job.id}'
+            }), 202
+    
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid URL'}), 400
     except Exception as e:
         logger.error(f"Error in download endpoint: {str(e)}")
         return jsonify({
@@ -492,29 +462,133 @@ def download():
             'error': f'An error occurred: {str(e)}'
         }), 500
 
-@app.route('/download_file')
-def download_file():
-    global last_downloaded_file
+def overloaded_response(error):
+    """429 telling the client how long to back off"""
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'retry_after': error.retry_after,
+        'queue_depth': error.queue_depth
+    }), 429, {'Retry-After': str(error.retry_after)}
+
+def send_image(filepath):
+    """Send a downloaded image as an attachment with its real type and extension"""
+    mimetype = mimetypes.guess_type(filepath)[0] or 'image/png'
+    extension = os.path.splitext(filepath)[1] or '.png'
+    return send_file(
+        filepath, 
+        as_attachment=True, 
+        download_name=f"Free_FB_Zone_Profile_Picture{extension}",
+        mimetype=mimetype
+    )
+
+@app.route('/download_file/<token>')
+def download_file(token):
     try:
-        # Check if we have a downloaded file
-        if last_downloaded_file and os.path.exists(last_downloaded_file):
-            return send_file(
-                last_downloaded_file, 
-                as_attachment=True, 
-                download_name="Free_FB_Zone_Profile_Picture.png",
-                mimetype='image/png'
-            )
+        # The token names exactly one stored image and expires after RESULT_TOKEN_TTL
+        filepath = result_tokens.resolve(token)
+        if filepath:
+            return send_image(filepath)
         else:
-            return jsonify({'success': False, 'error': 'No file available for download'}), 404
+            return jsonify({'success': False, 'error': 'Download link is invalid or has expired'}), 404
     except Exception as e:
         logger.error(f"Error serving file: {str(e)}")
         return jsonify({'success': False, 'error': f'Error serving file: {str(e)}'}), 500
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a download and return its id immediately"""
+    data = request.get_json(silent=True) or {}
+    url = data.get('url', '').strip()
+    if not url:
+        return jsonify({'success': False, 'error': 'No URL provided'}), 400
+    
+    try:
+        client = client_key()
+        job = cached_job(url, client) or job_manager.submit(url, client)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid URL'}), 400
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': f'/jobs/{job.id}'
+    }), 202, {'Location': f'/jobs/{job.id}'}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status and timings of a job, with a link to the image once it is done"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    
+    info = job.to_dict()
+    if job.status == 'done':
+        info['result_url'] = f'/download_file/{result_tokens.issue(job.result)}'
+        info['content_type'] = job.result['content_type']
+    return jsonify(info), 200
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream of a job's phases, ending with 'done' (with result_url) or 'failed'"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    if not event_streams.acquire(blocking=False):
+        # Every stream holds a web thread; keep some free for cheap requests
+        return jsonify({
+            'success': False,
+            'error': 'Too many progress streams open, poll the job instead',
+            'status_url': f'/jobs/{job.id}'
+        }), 503, {'Retry-After': '2'}
+    
+    def stream():
+        sent = 0
+        while True:
+            events = job.wait_events(sent, timeout=15)
+            if not events:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                if event['phase'] == 'done':
+                    event = dict(event, result_url=f'/download_file/{result_tokens.issue(job.result)}',
+                                 content_type=job.result['content_type'])
+                yield f"event: {event['phase']}\ndata: {json.dumps(event)}\n\n"
+            sent += len(events)
+            if events[-1]['phase'] in ('done', 'failed'):
+                return
+    
+    response = Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, whether the stream finished or the client left
+    response.call_on_close(event_streams.release)
+    return response
+
 @app.route('/health')
 def health():
     """Health check endpoint for Render"""
     return jsonify({'status': 'healthy'}), 200
 
+@app.route('/stats')
+def stats():
+    """Extraction strategy success rates, latencies and current order, plus cache and coalescing counters"""
+    return jsonify({
+        # With browser workers the strategies run, and are measured, in the worker processes
+        'strategies': browser_supervisor.strategy_stats() if browser_supervisor else extraction_engine.stats(),
+        'result_cache': result_cache.stats(),
+        'negative_cache': negative_cache.stats(),
+        'in_flight': download_flights.stats(),
+        'jobs': job_manager.stats(),
+        'admission': admission.stats(),
+        'browser_workers': browser_supervisor.stats() if browser_supervisor else None,
+        'reaper': process_reaper.stats(),
+        'memory': memory_governor.stats()
+    }), 200
+
 @app.route('/debug')
 def debug():
     """Comprehensive debug endpoint with extensive diagnostics"""
@@ -0,0 +1,154 @@
+"""
+ASGI entry point running the asyncio pipeline alongside the Flask app:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 10000
+
+Jobs waiting for a browser tab or for the network are coroutines, not threads,
+so one process can hold hundreds of them. It shares the image store, caches
+and result tokens with app.py, so /download_file/<token> links work on both.
+"""
+import os
+import json
+import asyncio
+import logging
+import mimetypes
+
+from fb_core import (
+    AdmissionController, DownloadFailed, ImageStore, NegativeCache, Overloaded, ResultCache, ResultTokens,
+    memory_governor, process_reaper
+)
+from fb_core.aio import AsyncExtractionEngine, download_to_store_async
+from fb_core.config import (
+    ASYNC_MAX_PAGES, ASYNC_QUEUE_LIMIT, IMAGE_CHUNK_SIZE, NEGATIVE_CACHE_ENTRIES, NEGATIVE_CACHE_TTLS,
+    RESULT_CACHE_DISK_ENTRIES, RESULT_CACHE_MEMORY_ENTRIES, RESULT_CACHE_TTL, RESULT_TOKEN_TTL, SECRET_KEY
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "downloads")
+image_store = ImageStore(os.path.join(DOWNLOADS_DIR, "store"))
+result_cache = ResultCache(
+    image_store,
+    os.path.join(DOWNLOADS_DIR, "results"),
+    ttl=RESULT_CACHE_TTL,
+    max_entries=RESULT_CACHE_MEMORY_ENTRIES,
+    max_disk_entries=RESULT_CACHE_DISK_ENTRIES
+)
+negative_cache = NegativeCache(NEGATIVE_CACHE_TTLS, NEGATIVE_CACHE_ENTRIES)
+result_tokens = ResultTokens(image_store, SECRET_KEY, max_age=RESULT_TOKEN_TTL)
+
+# Tabs are the scarce resource; waiting for one is cheap, so the queue can be long
+admission = AdmissionController(slots=ASYNC_MAX_PAGES, queue_limit=ASYNC_QUEUE_LIMIT, memory=memory_governor)
+engine = AsyncExtractionEngine(max_pages=ASYNC_MAX_PAGES)
+
+async def send_json(send, status, body, headers=()):
+    payload = json.dumps(body).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())] + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+async def send_image(send, filepath, extra_headers=()):
+    """Send a stored image as an attachment, reading it in chunks off the event loop"""
+    mimetype = mimetypes.guess_type(filepath)[0] or 'image/png'
+    extension = os.path.splitext(filepath)[1] or '.png'
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', mimetype.encode()),
+            (b'content-length', str(os.path.getsize(filepath)).encode()),
+            (b'content-disposition', f'attachment; filename=Free_FB_Zone_Profile_Picture{extension}'.encode())
+        ] + list(extra_headers)
+    })
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, IMAGE_CHUNK_SIZE)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': bool(chunk)})
+            if not chunk:
+                break
+
+async def read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(body or b'{}')
+    except ValueError:
+        return {}
+
+async def download(scope, receive, send):
+    data = await read_json(receive)
+    url = str(data.get('url', '')).strip()
+    if not url:
+        return await send_json(send, 400, {'success': False, 'error': 'No URL provided'})
+
+    try:
+        with admission.admit():
+            record = await download_to_store_async(url, image_store, engine, cache=result_cache, negative_cache=negative_cache)
+    except Overloaded as e:
+        return await send_json(send, 429, {
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after,
+            'queue_depth': e.queue_depth
+        }, [(b'retry-after', str(e.retry_after).encode())])
+    except DownloadFailed as e:
+        return await send_json(send, 400, {'success': False, 'error': e.message, 'cause': e.cause, 'cached': e.cached})
+    except ValueError:
+        return await send_json(send, 400, {'success': False, 'error': 'Invalid URL'})
+    except Exception as e:
+        logger.error(f"Error in download endpoint: {str(e)}")
+        return await send_json(send, 500, {'success': False, 'error': f'An error occurred: {str(e)}'})
+
+    if data.get('inline') or b'inline=1' in scope.get('query_string', b''):
+        return await send_image(send, image_store.absolute_path(record), [(b'cache-control', b'private, max-age=0')])
+    token = result_tokens.issue(record)
+    await send_json(send, 200, {'success': True, 'token': token, 'download_url': f'/download_file/{token}'})
+
+async def download_file(scope, receive, send, token):
+    filepath = result_tokens.resolve(token)
+    if not filepath:
+        return await send_json(send, 404, {'success': False, 'error': 'Download link is invalid or has expired'})
+    await send_image(send, filepath)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            process_reaper.start()
+            await engine.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    if method == 'POST' and path == '/download':
+        return await download(scope, receive, send)
+    if method == 'GET' and path.startswith('/download_file/'):
+        return await download_file(scope, receive, send, path[len('/download_file/'):])
+    if method == 'GET' and path == '/health':
+        return await send_json(send, 200, {'status': 'healthy'})
+    if method == 'GET' and path == '/stats':
+        return await send_json(send, 200, {
+            'result_cache': result_cache.stats(),
+            'negative_cache': negative_cache.stats(),
+            'admission': admission.stats(),
+            'reaper': process_reaper.stats(),
+            'memory': memory_governor.stats()
+        })
+    await send_json(send, 404, {'success': False, 'error': 'Not found'})
@@ -0,0 +1,35 @@
+"""
+Shared core for the Facebook profile picture downloaders.
+
+The Flask, CLI and Tk front ends are thin adapters over this package:
+the driver provider (discovery, options, warm pool), the extractor
+(strategy engine) and the image fetcher.
+
+The asyncio pipeline lives in fb_core.aio and is not imported here, so
+the Selenium front ends do not need aiohttp.
+"""
+from .admission import AdmissionController
+from .cache import LRUCache, NegativeCache, ResultCache
+from .driver import (
+    ChromeDriverPool, apply_resource_blocking, discover_chrome, driver_pool,
+    get_chrome_driver, get_chrome_options, invalidate_chrome_discovery,
+    quit_driver, reset_driver_session, start_warm_up, warm_up
+)
+from .extractor import (
+    ExtractionEngine, ExtractionStrategy, capture_image_from_network, classify_page,
+    classify_page_failure, extract_fbid, extract_image_from_metadata, extraction_engine,
+    pick_metadata_image, pick_scanned_image
+)
+from .errors import DownloadFailed, Overloaded
+from .jobs import FairQueue, Job, JobManager
+from .memory import MemoryGovernor, container_memory, memory_governor, process_tree_rss
+from .http_client import get_http_session
+from .fetcher import filename_from_url, sniff_image_type, stream_image, write_image
+from .reaper import ProcessReaper, process_reaper
+from .pipeline import download_profile_picture, download_to_store
+from .singleflight import SingleFlight
+from .supervisor import BrowserSupervisor
+from .store import ImageStore
+from .tokens import ResultTokens
+from .urls import normalize_photo_url
+from .waits import MEDIA_IMAGE_SELECTOR, wait_for_dom_settle, wait_for_page
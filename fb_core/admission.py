@@ -0,0 +1,124 @@
+"""
+Admission control: a bounded number of downloads in the system at once
+"""
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from .errors import Overloaded
+
+logger = logging.getLogger(__name__)
+
+class AdmissionController:
+    """
+    Bounds the downloads admitted to the pipeline to slots running plus queue_limit waiting.
+
+    slots is the number of browser sessions; anything admitted beyond that
+    waits for one. Requests past the bound are refused with a Retry-After
+    derived from an exponentially weighted moving average of service time,
+    so overload is answered in milliseconds instead of piling up threads.
+    With a memory governor, only one download at a time is admitted while
+    the container is close to its memory limit. With a capacity callable,
+    slots is only the upper bound: the live count it returns is used instead,
+    and the queue shrinks in proportion, so browsers that crashed or failed to
+    launch do not keep admitting work that cannot run.
+
+    Args:
+        slots (int): Browser sessions available to admitted downloads.
+        queue_limit (int): Admitted downloads allowed to wait for a session.
+        initial_service_time (float): Service time assumed before any is observed.
+        alpha (float): Weight of each new observation in the moving average.
+        memory (MemoryGovernor): Consulted for memory pressure; None to ignore memory.
+        capacity (callable): Returns the browser sessions able to run a download right now;
+            None to always count slots.
+    """
+
+    def __init__(self, slots, queue_limit, initial_service_time=10.0, alpha=0.2, memory=None, capacity=None):
+        self.slots = slots
+        self.queue_limit = queue_limit
+        self.capacity = capacity
+        self.memory = memory
+        self.memory_rejected = 0
+        self.alpha = alpha
+        self.service_time = initial_service_time
+        self.in_system = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def live_slots(self):
+        """Slots able to run a download now: slots, capped by the capacity callable"""
+        if self.capacity is None:
+            return self.slots
+        return max(0, min(self.slots, self.capacity()))
+
+    def _limit(self, live):
+        return live + math.ceil(self.queue_limit * live / max(1, self.slots))
+
+    @property
+    def limit(self):
+        return self._limit(self.live_slots())
+
+    def _retry_after(self, live):
+        # Called with the lock held: time for the queue ahead to drain one slot's worth
+        waiting = max(0, self.in_system - live)
+        return max(1, math.ceil(self.service_time * (waiting + 1) / max(1, live)))
+
+    def try_admit(self):
+        """
+        Take a place in the system.
+
+        Raises:
+            Overloaded: If slots and queue are full, or memory is short and a download is already running.
+        """
+        # Read outside the lock, they touch cgroup files and the browsers' own locks
+        under_pressure = self.memory is not None and self.memory.under_pressure()
+        live = self.live_slots()
+        with self._lock:
+            if under_pressure and self.in_system >= 1:
+                self.rejected += 1
+                self.memory_rejected += 1
+                retry_after = self._retry_after(live)
+                logger.warning(f"Rejecting download: memory limit close, retry after {retry_after}s")
+                raise Overloaded(retry_after, queue_depth=max(0, self.in_system - live))
+            if self.in_system >= self._limit(live):
+                self.rejected += 1
+                retry_after = self._retry_after(live)
+                logger.warning(f"Rejecting download: {self.in_system} in system, {live} live browser(s), "
+                               f"retry after {retry_after}s")
+                raise Overloaded(retry_after, queue_depth=max(0, self.in_system - live))
+            self.in_system += 1
+            self.admitted += 1
+
+    def release(self, service_seconds):
+        """Give the place back and fold the download's duration into the service time estimate"""
+        with self._lock:
+            self.in_system -= 1
+            self.service_time += self.alpha * (service_seconds - self.service_time)
+
+    @contextmanager
+    def admit(self):
+        """Hold a place for the duration of a with block"""
+        self.try_admit()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self):
+        live = self.live_slots()
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'live_slots': live,
+                'in_service': min(self.in_system, live),
+                'queue_depth': max(0, self.in_system - live),
+                'queue_limit': self._limit(live) - live,
+                'service_time': round(self.service_time, 3),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'memory_rejected': self.memory_rejected
+            }
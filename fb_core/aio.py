@@ -0,0 +1,501 @@
+"""
+asyncio pipeline: Chrome driven over an async DevTools connection, images fetched
+with aiohttp and files written in worker threads, so waiting jobs cost no threads
+"""
+import re
+import json
+import time
+import shutil
+import asyncio
+import logging
+import itertools
+import tempfile
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from .config import (
+    BLOCK_RESOURCES, BLOCKED_URL_PATTERNS, HTTP_POOL_MAXSIZE, HTTP_TIMEOUT, IMAGE_CHUNK_SIZE,
+    IMAGE_USER_AGENT, MAX_IMAGE_BYTES, METADATA_FAST_PATH, METADATA_TIMEOUT, METADATA_USER_AGENT,
+    PAGE_LOAD_TIMEOUT, PAGE_WAIT_TIMEOUT
+)
+from .driver import discover_chrome
+from .errors import DownloadFailed
+from .extractor import (
+    _BULK_IMAGE_SCAN_SCRIPT, _PAGE_SUMMARY_SCRIPT, FAILURE_MESSAGES, _no_progress,
+    classify_page, pick_metadata_image, pick_scanned_image
+)
+from .fetcher import _ImageWriter
+from .memory import memory_governor
+from .reaper import process_reaper
+from .urls import normalize_photo_url
+from .waits import MEDIA_IMAGE_SELECTOR, _WAIT_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+# Selenium-only or single-tab switches that do not apply to a shared DevTools browser
+_EXCLUDED_SWITCHES = ('--single-process', '--no-zygote', '--disable-dev-tools', '--remote-debugging')
+
+_DEVTOOLS_URL_RE = re.compile(r'DevTools listening on (ws://\S+)')
+
+def _as_function(script, *args):
+    """Wrap a Selenium-style script body (using return/arguments) as an expression for Runtime.evaluate"""
+    return f"(function () {{ {script} }}).apply(null, {json.dumps(list(args))})"
+
+def _as_promise(script, *args):
+    """Wrap a Selenium execute_async_script body so its callback resolves a promise"""
+    return (f"new Promise(function (resolve) {{ (function () {{ {script} }})"
+            f".apply(null, {json.dumps(list(args))}.concat([resolve])); }})")
+
+class CDPError(Exception):
+    """A DevTools command failed or the page threw"""
+
+class CDPConnection:
+    """
+    One DevTools websocket shared by the browser and all of its page sessions.
+
+    Commands are matched to replies by id; events are delivered to queues
+    registered with listen() for a (session, method) pair.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._listeners = {}
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def send(self, method, params=None, session_id=None, timeout=PAGE_LOAD_TIMEOUT):
+        """Run a DevTools command and return its result"""
+        command_id = next(self._ids)
+        message = {'id': command_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        try:
+            await self.websocket.send_str(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(command_id, None)
+
+    def listen(self, method, session_id=None):
+        """Return a queue receiving the params of every matching event until unlisten()"""
+        queue = asyncio.Queue()
+        self._listeners.setdefault((session_id, method), []).append(queue)
+        return queue
+
+    def unlisten(self, method, queue, session_id=None):
+        queues = self._listeners.get((session_id, method), [])
+        if queue in queues:
+            queues.remove(queue)
+
+    async def _read(self):
+        async for message in self.websocket:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                break
+            data = json.loads(message.data)
+            if 'id' in data:
+                future = self._pending.get(data['id'])
+                if future and not future.done():
+                    if 'error' in data:
+                        future.set_exception(CDPError(data['error'].get('message', 'DevTools error')))
+                    else:
+                        future.set_result(data.get('result', {}))
+            else:
+                for queue in self._listeners.get((data.get('sessionId'), data.get('method')), []):
+                    queue.put_nowait(data.get('params', {}))
+        # The browser went away: fail everything still waiting
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(CDPError('DevTools connection closed'))
+
+    @property
+    def closed(self):
+        return self._reader.done()
+
+    async def close(self):
+        await self.websocket.close()
+        self._reader.cancel()
+
+class AsyncPage:
+    """One tab, in its own browser context, addressed through a flattened DevTools session"""
+
+    def __init__(self, connection, session_id):
+        self.connection = connection
+        self.session_id = session_id
+
+    async def send(self, method, params=None, timeout=PAGE_LOAD_TIMEOUT):
+        return await self.connection.send(method, params, session_id=self.session_id, timeout=timeout)
+
+    async def navigate(self, url, timeout=PAGE_LOAD_TIMEOUT):
+        """Open url and wait for DOMContentLoaded, like Selenium's 'eager' page load strategy"""
+        loaded = self.connection.listen('Page.domContentEventFired', self.session_id)
+        try:
+            result = await self.send('Page.navigate', {'url': url}, timeout=timeout)
+            if result.get('errorText'):
+                raise CDPError(f"Navigation failed: {result['errorText']}")
+            await asyncio.wait_for(loaded.get(), timeout)
+        finally:
+            self.connection.unlisten('Page.domContentEventFired', loaded, self.session_id)
+
+    async def evaluate(self, expression, timeout=PAGE_LOAD_TIMEOUT):
+        """Evaluate an expression (awaiting it if it is a promise) and return its value"""
+        result = await self.send('Runtime.evaluate', {
+            'expression': expression,
+            'awaitPromise': True,
+            'returnByValue': True
+        }, timeout=timeout)
+        if 'exceptionDetails' in result:
+            raise CDPError(result['exceptionDetails'].get('text', 'Script error'))
+        return result['result'].get('value')
+
+class AsyncChrome:
+    """
+    One headless Chrome with a DevTools port, shared by every async job.
+
+    Each job gets a fresh tab in a throwaway browser context, so cookies and
+    storage never leak between jobs and nothing has to be reset afterwards.
+    At most max_pages tabs are open at once; other jobs wait without a thread.
+    Once the memory governor says the browser is due for recycling, later jobs
+    wait while the open tabs finish, then Chrome is relaunched.
+    """
+
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self.process = None
+        self.connection = None
+        self._http_session = None
+        self._profile_dir = None
+        self._recycle_task = None
+        self._recycling = False
+        self._open = 0  # tabs handed out by page()
+        self._tabs = asyncio.Condition()
+        self._start_lock = asyncio.Lock()
+
+    async def start(self, http_session):
+        """Launch Chrome and connect to it, once; a browser that died is replaced"""
+        async with self._start_lock:
+            self._http_session = http_session
+            if self.alive:
+                return
+            if self.process or self.connection:
+                logger.warning("Async Chrome is gone, relaunching it")
+                await self._shutdown()
+            await self._launch()
+
+    async def restart(self, only_if_dead=False):
+        """Close Chrome and launch a new one; jobs calling start() meanwhile wait for it"""
+        async with self._start_lock:
+            if only_if_dead and self.alive:
+                return
+            await self._shutdown()
+            await self._launch()
+
+    async def _launch(self):
+        # Called with _start_lock held
+        discovery = await asyncio.to_thread(discover_chrome)
+        # Reuse the Selenium switches; chromedriver adds the leading dashes some of them lack
+        arguments = [argument if argument.startswith('-') else f'--{argument}'
+                     for argument in discovery['options'].arguments
+                     if not argument.startswith(_EXCLUDED_SWITCHES)]
+        self._profile_dir = tempfile.mkdtemp(prefix='fb-chrome-')
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                discovery['chrome_bin'], *arguments,
+                '--remote-debugging-port=0', f'--user-data-dir={self._profile_dir}', 'about:blank',
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+            process_reaper.track(self.process.pid, self.process)
+            websocket_url = await asyncio.wait_for(self._devtools_url(), PAGE_LOAD_TIMEOUT)
+            websocket = await self._http_session.ws_connect(websocket_url, max_msg_size=0)
+        except BaseException:
+            # Do not leave a half-started browser behind
+            await self._shutdown()
+            raise
+        self.connection = CDPConnection(websocket)
+        logger.info(f"Async Chrome {discovery['chrome_version']} listening at {websocket_url}")
+
+    async def _devtools_url(self):
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                raise CDPError('Chrome exited before opening its DevTools port')
+            match = _DEVTOOLS_URL_RE.search(line.decode('utf-8', 'replace'))
+            if match:
+                # Keep draining stderr so Chrome never blocks on a full pipe
+                asyncio.ensure_future(self._drain_stderr())
+                return match.group(1)
+
+    async def _drain_stderr(self):
+        while await self.process.stderr.readline():
+            pass
+
+    @asynccontextmanager
+    async def page(self):
+        """Open a tab in a new browser context for the duration of an async with block"""
+        async with self._tabs:
+            await self._tabs.wait_for(lambda: self._open < self.max_pages and not self._recycling)
+            self._open += 1
+        try:
+            if not self.alive:
+                # Gone while this job waited for a tab, e.g. a failed relaunch
+                raise CDPError('Chrome is not running')
+            process = self.process
+            context = await self.connection.send('Target.createBrowserContext', {'disposeOnDetach': True})
+            context_id = context['browserContextId']
+            try:
+                target = await self.connection.send('Target.createTarget', {
+                    'url': 'about:blank',
+                    'browserContextId': context_id
+                })
+                attached = await self.connection.send('Target.attachToTarget', {
+                    'targetId': target['targetId'],
+                    'flatten': True
+                })
+                page = AsyncPage(self.connection, attached['sessionId'])
+                await page.send('Page.enable')
+                if BLOCK_RESOURCES:
+                    await page.send('Network.enable')
+                    await page.send('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+                yield page
+            finally:
+                try:
+                    await self.connection.send('Target.disposeBrowserContext', {'browserContextId': context_id})
+                except CDPError as e:
+                    logger.warning(f"Could not dispose browser context: {str(e)}")
+                # Every tab loads one page
+                if (not self._recycling and process is self.process
+                        and memory_governor.should_recycle(process, process.pid)):
+                    self._recycling = True
+                    self._recycle_task = asyncio.ensure_future(self._recycle())
+        finally:
+            async with self._tabs:
+                self._open -= 1
+                self._tabs.notify_all()
+
+    async def _recycle(self):
+        """Relaunch Chrome once the open tabs have finished; jobs asking for a tab meanwhile wait"""
+        async with self._tabs:
+            await self._tabs.wait_for(lambda: self._open == 0)
+        try:
+            await self.restart()
+        except Exception as e:
+            logger.error(f"Could not relaunch async Chrome: {str(e)}")
+        finally:
+            self._recycle_task = None
+            async with self._tabs:
+                self._recycling = False
+                self._tabs.notify_all()
+
+    @property
+    def alive(self):
+        return (self.connection is not None and not self.connection.closed
+                and self.process is not None and self.process.returncode is None)
+
+    async def close(self):
+        """Shut Chrome down; the next start() launches a new one"""
+        recycling = self._recycle_task
+        if recycling and recycling is not asyncio.current_task():
+            # Let a pending relaunch finish so its browser is not left behind
+            await recycling
+        async with self._start_lock:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        # Called with _start_lock held
+        if self.connection:
+            await self.connection.close()
+            self.connection = None
+        if self.process:
+            process_reaper.untrack(self.process.pid)
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+        self.process = None
+        if self._profile_dir:
+            shutil.rmtree(self._profile_dir, ignore_errors=True)
+            self._profile_dir = None
+
+class AsyncExtractionEngine:
+    """
+    asyncio counterpart of ExtractionEngine: metadata over HTTP first, then one
+    DevTools tab that waits for the photo and falls back to scanning every <img>.
+
+    Args:
+        max_pages (int): Browser tabs open at once.
+    """
+
+    def __init__(self, max_pages):
+        self.chrome = AsyncChrome(max_pages)
+        self.http = None
+
+    async def start(self):
+        if self.http is None:
+            self.http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=HTTP_POOL_MAXSIZE),
+                timeout=aiohttp.ClientTimeout(sock_connect=HTTP_TIMEOUT[0], sock_read=HTTP_TIMEOUT[1])
+            )
+
+    async def close(self):
+        await self.chrome.close()
+        if self.http:
+            await self.http.close()
+            self.http = None
+
+    async def _metadata(self, url):
+        try:
+            async with self.http.get(
+                url,
+                headers={'User-Agent': METADATA_USER_AGENT},
+                timeout=aiohttp.ClientTimeout(sock_connect=METADATA_TIMEOUT[0], sock_read=METADATA_TIMEOUT[1])
+            ) as response:
+                if response.status != 200:
+                    logger.info(f"Metadata fetch returned status {response.status}")
+                    return None
+                page_html = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Metadata fetch failed: {str(e)}")
+            return None
+        return pick_metadata_image(page_html, url)
+
+    async def _browser(self, url, progress):
+        await self.chrome.start(self.http)
+        async with self.chrome.page() as page:
+            progress('browser_acquired')
+            started = time.monotonic()
+            await page.navigate(url)
+            progress('navigated', seconds=round(time.monotonic() - started, 3))
+
+            timeout_ms = int(PAGE_WAIT_TIMEOUT * 1000)
+            waited = await page.evaluate(_as_promise(_WAIT_SCRIPT, MEDIA_IMAGE_SELECTOR, 750, timeout_ms),
+                                         timeout=PAGE_WAIT_TIMEOUT + 5)
+            if waited and waited.get('src'):
+                progress('located', strategy='css')
+                return waited['src']
+
+            image_url = pick_scanned_image(await page.evaluate(_as_function(_BULK_IMAGE_SCAN_SCRIPT)), url)
+            if image_url:
+                progress('located', strategy='js_bulk_scan')
+                return image_url
+
+            current_url, text = await page.evaluate(_as_function(_PAGE_SUMMARY_SCRIPT))
+            cause = classify_page(current_url, text)
+            raise DownloadFailed(cause, FAILURE_MESSAGES[cause])
+
+    async def run(self, url, progress=None):
+        """
+        Find the photo's image URL.
+
+        Raises:
+            DownloadFailed: If the photo could not be found, with the likely cause.
+        """
+        progress = progress or _no_progress
+        await self.start()
+        if METADATA_FAST_PATH:
+            image_url = await self._metadata(url)
+            if image_url:
+                progress('located', strategy='metadata')
+                return image_url
+        try:
+            return await self._browser(url, progress)
+        except (CDPError, asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+            # OSError: aiohttp raises ConnectionResetError when writing to a dead browser's socket
+            logger.error(f"DevTools error: {str(e)}")
+            if not self.chrome.alive:
+                logger.warning("Async Chrome died, relaunching it")
+                try:
+                    await self.chrome.restart(only_if_dead=True)
+                except (CDPError, asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+                    logger.error(f"Could not relaunch async Chrome, the next job will retry: {str(e)}")
+            raise DownloadFailed('browser_error', 'The browser failed while loading the photo.')
+
+    async def fetch(self, image_url, filepath, temp_dir=None):
+        """
+        Stream an image to disk like stream_image(), with file writes in worker threads.
+
+        Returns:
+            dict: Same as stream_image(), or None if the response was not an acceptable image.
+        """
+        await self.start()
+        async with self.http.get(image_url, headers={'User-Agent': IMAGE_USER_AGENT}) as response:
+            if response.status != 200:
+                logger.error(f"Failed to download image. Status code: {response.status}")
+                return None
+            if not response.content_type.startswith('image/'):
+                logger.error(f"Refusing to save non-image response: {response.content_type or 'no content type'}")
+                return None
+            if (response.content_length or 0) > MAX_IMAGE_BYTES:
+                logger.error(f"Image is larger than the {MAX_IMAGE_BYTES} byte limit ({response.content_length} bytes)")
+                return None
+
+            writer = await asyncio.to_thread(_ImageWriter, filepath, temp_dir)
+            try:
+                async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                    if not await asyncio.to_thread(writer.write, chunk):
+                        await asyncio.to_thread(writer.discard)
+                        return None
+                if writer.size == 0:
+                    logger.error("Image response was empty")
+                    await asyncio.to_thread(writer.discard)
+                    return None
+                return await asyncio.to_thread(writer.commit)
+            except BaseException:
+                await asyncio.to_thread(writer.discard)
+                raise
+
+async def download_to_store_async(url, store, engine, cache=None, negative_cache=None, progress=None):
+    """
+    asyncio version of download_to_store(), sharing its store and caches.
+
+    Args:
+        url (str): The Facebook photo URL.
+        store (ImageStore): Where to keep the image.
+        engine (AsyncExtractionEngine): Engine that locates and fetches the photo.
+        cache (ResultCache): Answer repeat requests for the same photo without touching the browser.
+        negative_cache (NegativeCache): Fail fast for photos that recently failed.
+        progress (callable): Called as progress(phase, **details) as the download advances.
+
+    Returns:
+        dict: The store record ('sha256', 'path', 'content_type', 'size').
+
+    Raises:
+        DownloadFailed: If the photo could not be downloaded, possibly answered from negative_cache.
+    """
+    progress = progress or _no_progress
+    key, canonical_url = normalize_photo_url(url)
+    if cache:
+        record = await asyncio.to_thread(cache.get, key)
+        if record:
+            logger.info(f"Result cache hit for {key}")
+            progress('cache_hit')
+            return record
+    if negative_cache:
+        failure = negative_cache.get(key)
+        if failure:
+            logger.info(f"Negative cache hit for {key}: {failure.cause}")
+            raise failure
+
+    try:
+        logger.info(f"Downloading {key} from {canonical_url}")
+        image_url = await engine.run(canonical_url, progress)
+        record = await asyncio.to_thread(store.lookup, image_url)
+        if not record:
+            record = store.record_saved(await engine.fetch(image_url, store.path_for, temp_dir=store.tmp_dir))
+            if not record:
+                raise DownloadFailed('fetch_failed', 'The image could not be downloaded from Facebook.')
+            progress('fetched', size=record['size'], content_type=record['content_type'])
+            await asyncio.to_thread(store.remember, image_url, record)
+    except DownloadFailed as e:
+        logger.error(f"Download of {key} failed ({e.cause}): {e.message}")
+        if negative_cache:
+            negative_cache.put(key, e)
+        raise
+
+    progress('stored', content_type=record['content_type'])
+    if cache:
+        await asyncio.to_thread(cache.put, key, record)
+    return record
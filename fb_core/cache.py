@@ -0,0 +1,223 @@
+"""
+URL-keyed result cache: an in-process LRU in front of a persistent on-disk layer
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .errors import DownloadFailed
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Thread-safe in-process LRU whose entries also expire after a TTL"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+class ResultCache:
+    """
+    Maps photo URLs to image store records so repeat requests skip the browser.
+
+    Level 1 is an LRUCache in this process; level 2 is one JSON file per URL
+    under directory, shared by every worker and surviving restarts. Both
+    levels honour the same TTL; the disk layer is pruned to max_disk_entries.
+    """
+
+    def __init__(self, store, directory, ttl, max_entries, max_disk_entries):
+        self.store = store
+        self.directory = directory
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.memory = LRUCache(max_entries, ttl)
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _count(self, level):
+        with self._lock:
+            if level:
+                self.hits[level] += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Return the cached store record for key, or None"""
+        record = self.memory.get(key)
+        if record and os.path.exists(self.store.absolute_path(record)):
+            self._count('memory')
+            return record
+
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry and entry['cached_at'] + self.ttl > time.time() and os.path.exists(self.store.absolute_path(entry['record'])):
+            record = entry['record']
+            # Keep the promoted entry only for the rest of its disk lifetime
+            self.memory.set(key, record, ttl=entry['cached_at'] + self.ttl - time.time())
+            self._count('disk')
+            return record
+
+        self._count(None)
+        return None
+
+    def put(self, key, record):
+        """Cache a store record for key in both levels"""
+        self.memory.set(key, record)
+        entry = {'key': key, 'record': record, 'cached_at': time.time()}
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write result cache entry: {str(e)}")
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % 50 == 0
+        if prune:
+            self.prune()
+
+    def delete(self, key):
+        self.memory.delete(key)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        """
+        Drop expired disk entries and the oldest ones beyond max_disk_entries, then
+        have the store delete the images no remaining entry or index entry refers to
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if mtime + self.ttl <= now:
+                self._unlink(path)
+            else:
+                entries.append((mtime, path))
+        entries.sort()
+        excess = max(0, len(entries) - self.max_disk_entries)
+        for _, path in entries[:excess]:
+            self._unlink(path)
+
+        referenced = set()
+        for _, path in entries[excess:]:
+            try:
+                with open(path) as f:
+                    referenced.add(json.load(f)['record']['sha256'])
+            except (OSError, ValueError, KeyError):
+                continue
+        self.store.prune(self.ttl, keep=referenced)
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_entries': len(self.memory),
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'ttl': self.ttl
+            }
+
+class NegativeCache:
+    """
+    Remembers recent download failures so repeats fail fast with the same cause.
+
+    Each cause has its own TTL: a deleted photo stays unavailable, whereas a
+    CDN hiccup deserves a quick retry. Causes with a TTL of 0 are not cached.
+    """
+
+    def __init__(self, ttls, max_entries):
+        self.ttls = dict(ttls)
+        self.memory = LRUCache(max_entries, 0)
+        self.hits = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a DownloadFailed for a recently failed key, or None"""
+        entry = self.memory.get(key)
+        if entry is None:
+            return None
+        cause, message = entry
+        with self._lock:
+            self.hits[cause] = self.hits.get(cause, 0) + 1
+        return DownloadFailed(cause, message, cached=True)
+
+    def put(self, key, failure):
+        """Record a DownloadFailed for key with its cause's TTL"""
+        ttl = self.ttls.get(failure.cause, 0)
+        if ttl > 0:
+            self.memory.set(key, (failure.cause, failure.message), ttl=ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.memory),
+                'hits': dict(self.hits),
+                'ttls': dict(self.ttls)
+            }
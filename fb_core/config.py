@@ -0,0 +1,133 @@
+"""
+Environment-driven settings shared by every front end
+"""
+import os
+import secrets
+
+def env_flag(name, default=False):
+    """Read a yes/no environment variable"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+# Warm pool settings: how many Chrome sessions to keep alive and how long a
+# request may wait for one to become free
+DRIVER_POOL_SIZE = int(os.environ.get('DRIVER_POOL_SIZE', '1'))
+DRIVER_ACQUIRE_TIMEOUT = float(os.environ.get('DRIVER_ACQUIRE_TIMEOUT', '60'))
+DRIVER_POOL_WARM = env_flag('DRIVER_POOL_WARM', True)
+
+# Crash isolation: run Chrome in this many supervised worker processes (one browser
+# each) instead of inside the web process; 0 keeps the in-process driver pool
+BROWSER_WORKERS = int(os.environ.get('BROWSER_WORKERS', '0'))
+# A worker busy for longer than this on one job is killed and the job retried elsewhere
+BROWSER_WORKER_JOB_TIMEOUT = float(os.environ.get('BROWSER_WORKER_JOB_TIMEOUT', '90'))
+# Browsers available to downloads, whichever way they are run
+BROWSER_SLOTS = BROWSER_WORKERS or DRIVER_POOL_SIZE
+
+# Orphaned browser reaper: seconds between /proc scans (0 disables it), and how long a
+# Chrome/ChromeDriver process must look orphaned before it is killed
+REAPER_INTERVAL = float(os.environ.get('REAPER_INTERVAL', '30'))
+REAPER_GRACE = float(os.environ.get('REAPER_GRACE', '60'))
+
+# Memory governor: a browser is quit instead of reused once its process tree holds more
+# than BROWSER_MAX_RSS_MB or it has loaded BROWSER_MAX_NAVIGATIONS pages (0 = no limit),
+# and downloads are refused once the container uses MEMORY_ADMIT_RATIO of its limit
+BROWSER_MAX_RSS_MB = int(os.environ.get('BROWSER_MAX_RSS_MB', '350'))
+BROWSER_MAX_NAVIGATIONS = int(os.environ.get('BROWSER_MAX_NAVIGATIONS', '100'))
+MEMORY_ADMIT_RATIO = float(os.environ.get('MEMORY_ADMIT_RATIO', '0.85'))
+
+# Upper bound for each event-driven wait for the photo after navigation
+PAGE_WAIT_TIMEOUT = float(os.environ.get('PAGE_WAIT_TIMEOUT', '5'))
+PAGE_LOAD_TIMEOUT = 30
+
+# Opt-in resource blocking: skip downloads the image selector never needs
+BLOCK_RESOURCES = env_flag('BLOCK_RESOURCES')
+# Also stop Chrome from loading images; the <img src> attributes stay readable
+BLOCK_IMAGES = env_flag('BLOCK_IMAGES')
+DEFAULT_BLOCKED_URL_PATTERNS = [
+    # Stylesheets and fonts
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf',
+    # Video and streaming segments
+    '*.mp4', '*.webm', '*.m4s', '*.mpd', '*.m3u8',
+    # Third-party analytics and ads
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*connect.facebook.net*'
+]
+# Comma-separated CDP URL patterns (wildcards allowed) replacing the defaults
+BLOCKED_URL_PATTERNS = [
+    pattern.strip() for pattern in os.environ.get('BLOCKED_URL_PATTERNS', '').split(',') if pattern.strip()
+] or DEFAULT_BLOCKED_URL_PATTERNS
+
+# How the photo URL is located: 'dom' reads the <img> element, 'network' watches
+# Chrome's network log for the fbcdn response and takes its bytes over CDP
+CAPTURE_MODE = os.environ.get('CAPTURE_MODE', 'dom').lower()
+
+# HTTP-only fast path: read the photo from og:image / embedded JSON before launching Chrome
+METADATA_FAST_PATH = env_flag('METADATA_FAST_PATH', True)
+METADATA_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+# Facebook serves Open Graph tags to its own link-preview crawler
+METADATA_USER_AGENT = 'facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)'
+
+# Shared keep-alive HTTP client: connection pool sizes, retries and timeouts
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '4'))  # distinct hosts kept warm
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '10'))  # connections per host
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '3'))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', '0.3'))
+HTTP_TIMEOUT = (
+    float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3.05')),
+    float(os.environ.get('HTTP_READ_TIMEOUT', '15'))
+)  # (connect, read) seconds
+
+# Streaming image download: read size and the largest image accepted
+IMAGE_CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', str(15 * 1024 * 1024)))
+
+# Result cache in front of the browser pipeline
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', '3600'))  # seconds
+RESULT_CACHE_MEMORY_ENTRIES = int(os.environ.get('RESULT_CACHE_MEMORY_ENTRIES', '256'))
+RESULT_CACHE_DISK_ENTRIES = int(os.environ.get('RESULT_CACHE_DISK_ENTRIES', '5000'))
+
+# Negative cache: how long a failure is remembered, per cause (seconds, 0 = never)
+NEGATIVE_CACHE_TTLS = {
+    'unavailable': 3600,  # deleted or not shared publicly
+    'login_required': 900,  # Facebook asked for a login
+    'image_not_found': 300,  # page loaded but no photo was located
+    'page_timeout': 30,  # page never finished loading; often a slow moment, not the URL
+    'fetch_failed': 60,  # CDN refused or returned a non-image
+    'browser_error': 0  # our problem, not the URL's
+}
+NEGATIVE_CACHE_TTLS.update({
+    cause: float(os.environ[f'NEGATIVE_CACHE_TTL_{cause.upper()}'])
+    for cause in NEGATIVE_CACHE_TTLS if f'NEGATIVE_CACHE_TTL_{cause.upper()}' in os.environ
+})
+NEGATIVE_CACHE_ENTRIES = int(os.environ.get('NEGATIVE_CACHE_ENTRIES', '1024'))
+
+# Admission control: downloads allowed to wait for a browser beyond the pool size;
+# past that requests get 429 with a Retry-After based on observed service time
+ADMISSION_QUEUE_LIMIT = int(os.environ.get('ADMISSION_QUEUE_LIMIT', str(2 * BROWSER_SLOTS)))
+
+# Background jobs: worker threads (one per browser by default) and how long
+# finished jobs stay queryable
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', str(BROWSER_SLOTS)))
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', '600'))  # seconds
+# Fair scheduling: jobs of one client that may run at once, and may be queued or running
+JOB_CLIENT_CONCURRENCY = int(os.environ.get('JOB_CLIENT_CONCURRENCY', str(max(1, JOB_WORKERS // 2))))
+JOB_CLIENT_PENDING = int(os.environ.get('JOB_CLIENT_PENDING', str(JOB_CLIENT_CONCURRENCY + 1)))
+# How long the blocking /download waits for its job before answering with the job link
+DOWNLOAD_WAIT_TIMEOUT = float(os.environ.get('DOWNLOAD_WAIT_TIMEOUT', '100'))
+# Job progress streams (SSE) open at once; each holds a web thread until its job ends,
+# so keep this under gunicorn's --threads. Past it the page polls /jobs/<id> instead
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '4'))
+
+# Result tokens: signing key and lifetime of /download_file/<token> links. Without
+# SECRET_KEY a random key is used, so tokens only work in the process that issued them
+SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+RESULT_TOKEN_TTL = float(os.environ.get('RESULT_TOKEN_TTL', '900'))  # seconds
+
+# asyncio pipeline (asgi.py): browser tabs open at once, and downloads allowed to
+# wait for one - waiting costs no thread there, so the queue can be long
+ASYNC_MAX_PAGES = int(os.environ.get('ASYNC_MAX_PAGES', '4'))
+ASYNC_QUEUE_LIMIT = int(os.environ.get('ASYNC_QUEUE_LIMIT', '200'))
+
+# User agent for fetching the image itself from fbcdn
+IMAGE_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
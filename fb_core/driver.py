@@ -0,0 +1,474 @@
+"""
+Chrome/ChromeDriver discovery, session options and the warm driver pool
+"""
+import os
+import time
+import atexit
+import logging
+import platform
+import threading
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+
+from .config import (
+    BLOCK_IMAGES, BLOCK_RESOURCES, BLOCKED_URL_PATTERNS, CAPTURE_MODE,
+    DRIVER_POOL_SIZE, DRIVER_POOL_WARM
+)
+from .memory import memory_governor
+from .reaper import process_reaper
+
+logger = logging.getLogger(__name__)
+
+if CAPTURE_MODE == 'network' and BLOCK_IMAGES:
+    logger.warning("CAPTURE_MODE=network needs images to load; BLOCK_IMAGES will make it fall back to the DOM")
+
+# Result of the one-time Chrome/ChromeDriver discovery, shared by every request
+_chrome_discovery = None
+_chrome_discovery_lock = threading.Lock()
+
+def _load_chrome_env():
+    """Load the variables build.sh writes to ~/.chrome_env when running on Render"""
+    from pathlib import Path
+    
+    if os.environ.get('RENDER'):
+        env_file = Path.home() / '.chrome_env'
+        if env_file.exists():
+            logger.info(f"Loading environment from {env_file}")
+            with open(env_file) as f:
+                for line in f:
+                    if line.startswith('export '):
+                        line = line.replace('export ', '')
+                        key, value = line.strip().split('=', 1)
+                        os.environ[key] = value
+                        logger.info(f"Loaded {key}={value}")
+
+def _find_chrome_binary():
+    """Locate the Chrome/Chromium executable"""
+    import shutil
+    
+    # Check if CHROME_BIN is set and points to an existing file
+    chrome_bin = os.environ.get('CHROME_BIN')
+    if chrome_bin and os.path.exists(chrome_bin):
+        return chrome_bin
+    
+    logger.warning(f"CHROME_BIN not set or does not exist: {chrome_bin}")
+    # Try common locations
+    common_paths = [
+        "/usr/bin/google-chrome-stable",
+        "/usr/bin/google-chrome",
+        "/usr/bin/chromium-browser",
+        "/usr/bin/chromium",
+        "C:/Program Files/Google/Chrome/Application/chrome.exe",
+        "C:/Program Files (x86)/Google/Chrome/Application/chrome.exe",
+        os.path.expandvars("%LOCALAPPDATA%/Google/Chrome/Application/chrome.exe")
+    ]
+    for path in common_paths:
+        if os.path.exists(path):
+            os.environ['CHROME_BIN'] = path
+            logger.info(f"Found Chrome at: {path}")
+            return path
+    
+    # Try to find Chrome using which command
+    for browser in ['google-chrome-stable', 'google-chrome', 'chromium-browser', 'chromium']:
+        path = shutil.which(browser)
+        if path:
+            os.environ['CHROME_BIN'] = path
+            logger.info(f"Found Chrome in PATH: {path}")
+            return path
+    
+    logger.error("Chrome not found in any location!")
+    logger.error(f"Common paths checked: {common_paths}")
+    raise FileNotFoundError("Chrome browser is not installed. Please ensure Chrome is installed via build.sh")
+
+def _find_chromedriver():
+    """Locate ChromeDriver, falling back to webdriver-manager for local development"""
+    # Try to get ChromeDriver path from environment
+    chromedriver_path = os.environ.get('CHROMEDRIVER_PATH')
+    if chromedriver_path and os.path.exists(chromedriver_path):
+        return chromedriver_path
+    
+    # If not set, try common locations
+    for path in ['/usr/local/bin/chromedriver', '/usr/bin/chromedriver']:
+        if os.path.exists(path):
+            return path
+    
+    # If we're not on Render (local development), try webdriver-manager
+    if not os.environ.get('RENDER'):
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+            logger.info("Attempting to use webdriver-manager for ChromeDriver (local development)")
+            os.environ['WDM_LOG'] = '0'  # Disable webdriver-manager logging
+            return ChromeDriverManager().install()
+        except Exception as e:
+            logger.warning(f"Failed to install ChromeDriver with webdriver-manager: {str(e)}")
+    
+    return None
+
+def _get_binary_version(path):
+    """Run `<binary> --version` and return its output, or None if it fails"""
+    import subprocess
+    
+    try:
+        result = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            return result.stdout.strip()
+        logger.warning(f"Could not get version of {path}: {result.stderr}")
+    except Exception as e:
+        logger.warning(f"Could not get version of {path}: {e}")
+    return None
+
+def _build_chrome_options(chrome_bin, headless=True):
+    """Build the Chrome options used for every session"""
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless=new")  # Use new headless mode
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")  # Already present for sandbox issues
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-setuid-sandbox")  # Already present for sandbox issues
+    if platform.system() == "Linux":
+        # Keeps the process count down in memory-constrained containers
+        chrome_options.add_argument("--single-process")
+        chrome_options.add_argument("--no-zygote")
+    chrome_options.add_argument("--disable-dev-tools")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--disable-web-security")
+    chrome_options.add_argument("--disable-features=VizDisplayCompositor")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument("--disable-software-rasterizer")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-background-timer-throttling")
+    chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+    chrome_options.add_argument("--disable-renderer-backgrounding")
+    chrome_options.add_argument("--disable-ipc-flooding-protection")
+    chrome_options.add_argument("--disable-logging")
+    chrome_options.add_argument("--disable-breakpad")
+    chrome_options.add_argument("--disable-component-update")
+    chrome_options.add_argument("--disable-default-apps")
+    chrome_options.add_argument("--disable-domain-reliability")
+    chrome_options.add_argument("--disable-sync")
+    chrome_options.add_argument("--disable-translate")
+    chrome_options.add_argument("--metrics-recording-only")
+    chrome_options.add_argument("--no-first-run")
+    chrome_options.add_argument("--safebrowsing-disable-auto-update")
+    chrome_options.add_argument("--ignore-certificate-errors")
+    chrome_options.add_argument("--ignore-ssl-errors")
+    chrome_options.add_argument("--ignore-certificate-errors-spki-list")
+    chrome_options.add_argument("--disable-features=TranslateUI")
+    chrome_options.add_argument("--disable-features=ProcessPerSiteUpToMainFrameThreshold")
+    chrome_options.add_argument("user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    
+    # Return from driver.get() at DOMContentLoaded; wait_for_page() takes it from there
+    chrome_options.page_load_strategy = 'eager'
+    
+    if CAPTURE_MODE == 'network':
+        # Record Network.* DevTools events so they can be read with driver.get_log('performance')
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    
+    if BLOCK_IMAGES:
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2
+        })
+    
+    # Set the binary location
+    chrome_options.binary_location = chrome_bin
+    return chrome_options
+
+def discover_chrome(force=False):
+    """
+    Resolve Chrome and ChromeDriver once per process and cache the result.
+    
+    Args:
+        force (bool): Ignore the cached result and probe everything again.
+    
+    Returns:
+        dict: Binary paths, versions and the prebuilt Chrome options.
+    """
+    global _chrome_discovery
+    with _chrome_discovery_lock:
+        if _chrome_discovery is not None and not force:
+            return _chrome_discovery
+        
+        started = time.monotonic()
+        _load_chrome_env()
+        
+        # Log environment information
+        logger.info("="*50)
+        logger.info("Chrome Detection Starting...")
+        logger.info(f"Environment variables:")
+        logger.info(f"CHROME_BIN: {os.environ.get('CHROME_BIN', 'Not set')}")
+        logger.info(f"PATH: {os.environ.get('PATH', 'Not set')}")
+        logger.info(f"HOME: {os.environ.get('HOME', 'Not set')}")
+        
+        chrome_bin = _find_chrome_binary()
+        logger.info(f"Using Chrome binary: {chrome_bin}")
+        chrome_version = _get_binary_version(chrome_bin)
+        logger.info(f"Chrome version: {chrome_version}")
+        
+        chromedriver_path = _find_chromedriver()
+        chromedriver_version = _get_binary_version(chromedriver_path) if chromedriver_path else None
+        logger.info(f"Using ChromeDriver: {chromedriver_path} ({chromedriver_version})")
+        
+        _chrome_discovery = {
+            'chrome_bin': chrome_bin,
+            'chrome_version': chrome_version,
+            'chromedriver_path': chromedriver_path,
+            'chromedriver_version': chromedriver_version,
+            'options': _build_chrome_options(chrome_bin),
+            'discovered_at': time.time()
+        }
+        logger.info(f"Chrome discovery finished in {time.monotonic() - started:.2f}s")
+        logger.info("="*50)
+        return _chrome_discovery
+
+def invalidate_chrome_discovery():
+    """Drop the cached discovery so the next launch probes everything again"""
+    global _chrome_discovery
+    with _chrome_discovery_lock:
+        _chrome_discovery = None
+
+def get_chrome_options(headless=True):
+    """Get Chrome options configured for Render environment"""
+    discovery = discover_chrome()
+    if headless:
+        return discovery['options']
+    # Visible windows are only used by the desktop UI, no need to cache them
+    return _build_chrome_options(discovery['chrome_bin'], headless=False)
+
+def _chromedriver_pid(driver):
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return process.pid if process else None
+
+def _track_driver(driver):
+    """Register the session's ChromeDriver with the reaper, which kills it if the session is dropped without quit()"""
+    pid = _chromedriver_pid(driver)
+    if pid:
+        process_reaper.track(pid, driver)
+
+def quit_driver(driver):
+    """Quit a session; if quit() fails, its processes are left for the reaper"""
+    pid = _chromedriver_pid(driver)
+    if pid:
+        process_reaper.untrack(pid)
+    driver.quit()
+
+def _launch_chrome_driver(discovery, headless=True):
+    """Start a Chrome session from a discovery result"""
+    chrome_options = discovery['options'] if headless else _build_chrome_options(discovery['chrome_bin'], headless=False)
+    chromedriver_path = discovery['chromedriver_path']
+    
+    # If we have a valid ChromeDriver path, use it
+    if chromedriver_path and os.path.exists(chromedriver_path):
+        try:
+            logger.info(f"Initializing ChromeDriver from: {chromedriver_path}")
+            service = Service(chromedriver_path)
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+            logger.info("ChromeDriver initialized successfully")
+            _track_driver(driver)
+            return driver
+        except Exception as e:
+            logger.warning(f"Failed to initialize ChromeDriver from {chromedriver_path}: {str(e)}")
+    
+    # Last resort: try without explicit service
+    try:
+        logger.info("Attempting to initialize ChromeDriver without explicit path")
+        driver = webdriver.Chrome(options=chrome_options)
+        logger.info("ChromeDriver initialized successfully without explicit path")
+        _track_driver(driver)
+        return driver
+    except Exception as e:
+        logger.error(f"Failed to initialize ChromeDriver: {str(e)}")
+        raise RuntimeError(f"Unable to initialize ChromeDriver. Error: {str(e)}")
+
+def apply_resource_blocking(driver, patterns=None):
+    """Block URL patterns for every later navigation of this session via CDP"""
+    patterns = patterns or BLOCKED_URL_PATTERNS
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    logger.info(f"Blocking {len(patterns)} URL pattern(s) for this Chrome session")
+
+def get_chrome_driver(block_resources=None, headless=True):
+    """
+    Get Chrome driver configured for Render environment with proper error handling
+    
+    Args:
+        block_resources (bool): Block BLOCKED_URL_PATTERNS in the new session.
+            Defaults to the BLOCK_RESOURCES environment setting.
+        headless (bool): Run Chrome without a visible window.
+    """
+    if block_resources is None:
+        block_resources = BLOCK_RESOURCES
+    
+    try:
+        driver = _launch_chrome_driver(discover_chrome(), headless)
+    except Exception as e:
+        # Binaries may have moved or been upgraded since boot; probe again once
+        logger.warning(f"Chrome launch failed with cached discovery, rediscovering: {str(e)}")
+        invalidate_chrome_discovery()
+        try:
+            driver = _launch_chrome_driver(discover_chrome(), headless)
+        except Exception as e:
+            logger.error(f"Error in get_chrome_driver(): {str(e)}")
+            raise
+    
+    if block_resources:
+        try:
+            apply_resource_blocking(driver)
+        except Exception as e:
+            logger.warning(f"Could not enable resource blocking: {str(e)}")
+    return driver
+
+def reset_driver_session(driver):
+    """Clear cookies, storage and extra tabs so the next request starts from a clean profile"""
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    
+    # Wipe storage for the page we are leaving (local storage, IndexedDB, service workers...)
+    origin = driver.execute_script("return window.location.origin")
+    if origin and origin != 'null':
+        driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+    driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+    driver.get('about:blank')
+
+class ChromeDriverPool:
+    """Bounded, thread-safe pool of pre-launched Chrome sessions.
+    
+    Sessions are checked out with acquire() and handed back with release(),
+    so the Chrome start-up cost is paid once per session instead of once
+    per request.
+    """
+    
+    def __init__(self, size, factory):
+        self.size = max(1, size)
+        self.factory = factory
+        self._idle = []
+        self._created = 0
+        self._launch_failing = False
+        self._closed = False
+        self._cond = threading.Condition()
+    
+    def acquire(self, timeout=None):
+        """Check out an idle session, launching a new one while below the size limit"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Chrome driver pool is closed")
+                if self._idle:
+                    # Most recently used session first, it is the warmest
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No Chrome session became free within {timeout}s")
+                self._cond.wait(remaining)
+        
+        # Launch outside the lock so other threads can keep checking sessions in and out
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._launch_failing = True
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._launch_failing = False
+        return driver
+    
+    def release(self, driver, discard=False, used=True):
+        """
+        Return a session to the pool, or quit it if it is broken or due for recycling.
+        
+        Args:
+            driver: The session from acquire().
+            discard (bool): Quit the session instead of reusing it.
+            used (bool): The session loaded a page; False for sessions only pre-launched by warm().
+        """
+        # Every real checkout loads one page
+        if not discard and used and memory_governor.should_recycle(driver, _chromedriver_pid(driver)):
+            discard = True
+        if not discard:
+            try:
+                reset_driver_session(driver)
+            except Exception as e:
+                logger.warning(f"Could not reset Chrome session, discarding it: {str(e)}")
+                discard = True
+        
+        with self._cond:
+            if not discard and not self._closed:
+                self._idle.append(driver)
+                self._cond.notify()
+                return
+            self._created -= 1
+            self._cond.notify()
+        
+        try:
+            quit_driver(driver)
+        except Exception as e:
+            logger.warning(f"Error quitting Chrome session: {str(e)}")
+    
+    def capacity(self):
+        """
+        Sessions able to serve a download now.
+        
+        The full size while launches succeed; after a failed launch only the
+        sessions already running, and at least one so a request can try again.
+        """
+        with self._cond:
+            if self._launch_failing:
+                return max(1, self._created)
+            return self.size
+    
+    def warm(self):
+        """Pre-launch sessions until the pool is full"""
+        drivers = []
+        try:
+            for _ in range(self.size):
+                drivers.append(self.acquire(timeout=0))
+        except TimeoutError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not pre-launch Chrome session: {str(e)}")
+        for driver in drivers:
+            self.release(driver, used=False)
+        logger.info(f"Chrome driver pool warmed with {len(drivers)} session(s)")
+    
+    def close(self):
+        """Quit every idle session and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for driver in idle:
+            try:
+                quit_driver(driver)
+            except Exception:
+                pass
+
+driver_pool = ChromeDriverPool(DRIVER_POOL_SIZE, get_chrome_driver)
+atexit.register(driver_pool.close)
+
+def warm_up():
+    """Run Chrome discovery and pre-launch the pool so the first request does not pay for it"""
+    try:
+        discover_chrome()
+    except Exception as e:
+        logger.error(f"Chrome discovery failed at startup: {str(e)}")
+        return
+    if DRIVER_POOL_WARM:
+        driver_pool.warm()
+
+def start_warm_up():
+    """Run warm_up() in a background thread"""
+    thread = threading.Thread(target=warm_up, name='chrome-boot', daemon=True)
+    thread.start()
+    return thread
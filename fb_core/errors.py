@@ -0,0 +1,34 @@
+"""
+Exceptions raised by the download pipeline
+"""
+
+class DownloadFailed(Exception):
+    """
+    The photo could not be downloaded.
+
+    Attributes:
+        cause (str): Machine-readable reason, one of 'unavailable', 'login_required',
+            'image_not_found', 'page_timeout', 'fetch_failed' or 'browser_error'.
+        message (str): Human-readable explanation.
+        cached (bool): True when the failure was answered from the negative cache.
+    """
+
+    def __init__(self, cause, message, cached=False):
+        super().__init__(message)
+        self.cause = cause
+        self.message = message
+        self.cached = cached
+
+class Overloaded(Exception):
+    """
+    Every browser slot is busy and the admission queue is full.
+
+    Attributes:
+        retry_after (int): Seconds the client should wait before retrying.
+        queue_depth (int): Downloads currently waiting for a browser.
+    """
+
+    def __init__(self, retry_after, queue_depth):
+        super().__init__(f"Server is busy, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+        self.queue_depth = queue_depth
@@ -0,0 +1,406 @@
+"""
+Strategies for locating the photo URL and the engine that orders them by cost
+"""
+import re
+import html
+import json
+import time
+import base64
+import logging
+import threading
+import requests
+from urllib.parse import urlparse, parse_qs
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import (
+    JavascriptException, NoSuchElementException, StaleElementReferenceException, TimeoutException,
+    WebDriverException
+)
+
+from .config import (
+    CAPTURE_MODE, DRIVER_ACQUIRE_TIMEOUT, METADATA_FAST_PATH, METADATA_TIMEOUT,
+    METADATA_USER_AGENT, PAGE_LOAD_TIMEOUT, PAGE_WAIT_TIMEOUT
+)
+from .driver import driver_pool
+from .errors import DownloadFailed
+from .http_client import get_http_session
+from .waits import wait_for_page
+
+logger = logging.getLogger(__name__)
+
+_OG_IMAGE_RE = re.compile(r'<meta[^>]+property=["\']og:image["\'][^>]+content=["\']([^"\']+)["\']', re.IGNORECASE)
+_JSON_IMAGE_RE = re.compile(r'"image"\s*:\s*\{\s*"uri"\s*:\s*"((?:[^"\\]|\\.)+)"')
+
+class ExtractionStrategy:
+    """One way of locating the photo, with running latency and success statistics"""
+    
+    def __init__(self, name, func, needs_browser=False, prior_seconds=1.0, enabled=None):
+        self.name = name
+        self.func = func
+        self.needs_browser = needs_browser
+        self.prior_seconds = prior_seconds
+        self.enabled = enabled or (lambda: True)
+        self.attempts = 0
+        self.successes = 0
+        self.total_seconds = 0.0
+    
+    def expected_cost(self):
+        """Average latency divided by success rate, i.e. expected seconds per success"""
+        # Smoothed with one prior attempt so untried strategies still get their turn
+        avg_seconds = (self.total_seconds + self.prior_seconds) / (self.attempts + 1)
+        success_rate = (self.successes + 1) / (self.attempts + 2)
+        return avg_seconds / success_rate
+    
+    def stats(self):
+        return {
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'success_rate': self.successes / self.attempts if self.attempts else None,
+            'avg_seconds': self.total_seconds / self.attempts if self.attempts else None,
+            'expected_cost': self.expected_cost(),
+            'needs_browser': self.needs_browser
+        }
+
+class ExtractionEngine:
+    """
+    Registry of extraction strategies, tried cheapest-first by observed expected cost.
+    
+    Strategies are called with a context dict holding 'url', the 'driver' (for
+    browser strategies, already navigated) and may set 'image_bytes'. They
+    return the image URL or None.
+    """
+    
+    def __init__(self, pool):
+        self.pool = pool
+        self._strategies = []
+        self._navigation = ExtractionStrategy('navigation', None, needs_browser=True, prior_seconds=5.0)
+        self._lock = threading.Lock()
+    
+    def register(self, name, needs_browser=False, prior_seconds=1.0, enabled=None):
+        """Decorator adding a strategy function to the registry"""
+        def decorator(func):
+            with self._lock:
+                self._strategies.append(ExtractionStrategy(name, func, needs_browser, prior_seconds, enabled))
+            return func
+        return decorator
+    
+    def _record(self, strategy, hit, elapsed):
+        with self._lock:
+            strategy.attempts += 1
+            strategy.successes += 1 if hit else 0
+            strategy.total_seconds += elapsed
+    
+    def ordered(self):
+        """Enabled strategies sorted by expected cost, browser ones paying for navigation too"""
+        with self._lock:
+            navigation_cost = self._navigation.expected_cost()
+            strategies = [strategy for strategy in self._strategies if strategy.enabled()]
+            return sorted(strategies, key=lambda strategy: strategy.expected_cost() + (navigation_cost if strategy.needs_browser else 0))
+    
+    def stats(self):
+        with self._lock:
+            stats = {strategy.name: strategy.stats() for strategy in self._strategies}
+            stats['navigation'] = self._navigation.stats()
+        stats['order'] = [strategy.name for strategy in self.ordered()]
+        return stats
+    
+    def _navigate(self, context):
+        """Check a Chrome session out of the pool and open the photo page"""
+        driver = self.pool.acquire(timeout=DRIVER_ACQUIRE_TIMEOUT)
+        context['driver'] = driver
+        context['progress']('browser_acquired')
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        
+        if CAPTURE_MODE == 'network':
+            # Drop log entries left over from the previous request on this session
+            driver.get_log('performance')
+        
+        logger.info(f"Opening URL: {context['url']}")
+        started = time.monotonic()
+        try:
+            driver.get(context['url'])
+        except TimeoutException:
+            # The session is fine and the page is usually far enough along to search
+            context['timed_out'] = True
+            logger.warning(f"Page load timed out after {PAGE_LOAD_TIMEOUT}s, searching what has loaded")
+            try:
+                driver.execute_script('window.stop();')
+            except WebDriverException:
+                pass
+        elapsed = time.monotonic() - started
+        self._record(self._navigation, not context['timed_out'], elapsed)
+        context['progress']('navigated', seconds=round(elapsed, 3))
+    
+    def run(self, url, failure_screenshot=None, progress=None):
+        """
+        Try strategies in order until one finds the photo.
+        
+        Args:
+            url (str): The Facebook photo URL.
+            failure_screenshot (str): Where to save a screenshot of the page if every strategy fails.
+            progress (callable): Called as progress(phase, **details) on 'browser_acquired',
+                'navigated' and 'located'.
+        
+        Returns:
+            tuple: (image_url, image_bytes); image_bytes is None unless a strategy
+                could reuse the browser's copy.
+        
+        Raises:
+            DownloadFailed: If no strategy found the photo, with the likely cause.
+        """
+        context = {'url': url, 'driver': None, 'image_bytes': None, 'timed_out': False, 'progress': progress or _no_progress}
+        broken = False
+        try:
+            for strategy in self.ordered():
+                if strategy.needs_browser:
+                    if broken:
+                        continue
+                    if context['driver'] is None:
+                        try:
+                            self._navigate(context)
+                        except WebDriverException as e:
+                            logger.error(f"WebDriver error: {str(e)}")
+                            broken = True
+                            continue
+                
+                started = time.monotonic()
+                image_url = None
+                try:
+                    image_url = strategy.func(context)
+                except _PAGE_ERRORS as e:
+                    # The page lacks what the strategy looked for; the session itself is fine
+                    logger.warning(f"{strategy.name} strategy failed: {e.__class__.__name__}")
+                except WebDriverException as e:
+                    logger.error(f"WebDriver error in {strategy.name} strategy: {str(e)}")
+                    broken = True
+                except Exception as e:
+                    logger.warning(f"{strategy.name} strategy failed: {str(e)}")
+                elapsed = time.monotonic() - started
+                self._record(strategy, image_url is not None, elapsed)
+                
+                if image_url:
+                    logger.info(f"Found profile image with {strategy.name} strategy in {elapsed:.2f}s")
+                    context['progress']('located', strategy=strategy.name)
+                    return image_url, context['image_bytes']
+                logger.info(f"{strategy.name} strategy found nothing in {elapsed:.2f}s")
+            
+            if broken:
+                raise DownloadFailed('browser_error', 'The browser failed while loading the photo.')
+            cause = 'image_not_found'
+            if context['driver']:
+                cause = classify_page_failure(context['driver'])
+                if cause == 'image_not_found' and context['timed_out']:
+                    cause = 'page_timeout'
+                if failure_screenshot:
+                    context['driver'].save_screenshot(failure_screenshot)
+                    logger.info(f"Saved page screenshot for debugging: {failure_screenshot}")
+            raise DownloadFailed(cause, FAILURE_MESSAGES[cause])
+        finally:
+            if context['driver']:
+                self.pool.release(context['driver'], discard=broken)
+
+# WebDriverException subclasses raised by a healthy session on a page without the photo
+_PAGE_ERRORS = (JavascriptException, NoSuchElementException, StaleElementReferenceException, TimeoutException)
+
+def _no_progress(phase, **details):
+    pass
+
+extraction_engine = ExtractionEngine(driver_pool)
+
+FAILURE_MESSAGES = {
+    'unavailable': 'The photo is unavailable. It may have been deleted.',
+    'login_required': 'The photo is private or requires logging in.',
+    'image_not_found': 'Could not find the profile image on the page.',
+    'page_timeout': 'The photo page took too long to load.'
+}
+
+# Text Facebook shows instead of a photo that was deleted or is not shared publicly
+_UNAVAILABLE_MARKERS = ("this content isn't available", "this page isn't available", "content not found")
+
+# Reads the address and the start of the visible text of the page
+_PAGE_SUMMARY_SCRIPT = "return [location.href, document.body ? document.body.innerText.slice(0, 5000) : '']"
+
+def classify_page_failure(driver):
+    """Guess why the photo was not found from the page the browser ended up on"""
+    try:
+        current_url, text = driver.execute_script(_PAGE_SUMMARY_SCRIPT)
+    except WebDriverException:
+        return 'image_not_found'
+    return classify_page(current_url, text)
+
+def classify_page(current_url, text):
+    """Failure cause implied by a page's address and visible text"""
+    if '/login' in current_url or 'checkpoint' in current_url:
+        return 'login_required'
+    text = text.lower()
+    if any(marker in text for marker in _UNAVAILABLE_MARKERS):
+        return 'unavailable'
+    if 'log in to continue' in text or 'you must log in' in text:
+        return 'login_required'
+    return 'image_not_found'
+
+def extract_fbid(url):
+    """Return the fbid query parameter of a Facebook photo URL, if any"""
+    return parse_qs(urlparse(url).query).get('fbid', [None])[0]
+
+def capture_image_from_network(driver, page_url, timeout=5):
+    """
+    Pick the photo out of Chrome's network log and read its bytes over CDP.
+    
+    Args:
+        driver: Chrome session started with performance logging enabled.
+        page_url (str): The Facebook photo URL that was navigated to.
+        timeout (float): Seconds to wait for the photo's response to finish loading.
+    
+    Returns:
+        tuple: (image_url, image_bytes), or (None, None) if the photo was not seen or
+            the URL has no numeric fbid to recognise it by. image_bytes is None when
+            the URL was found but the body could not be read.
+    """
+    fbid = extract_fbid(page_url)
+    if not (fbid and fbid.isdigit()):
+        # Nothing ties one of the page's images to the photo (pfbid links, non-photo
+        # URLs); whatever has loaded first is usually an avatar, so leave it to the DOM
+        logger.info("No numeric fbid in the URL, skipping network capture")
+        return None, None
+    responses = {}
+    finished = []
+    match = None
+    deadline = time.monotonic() + timeout
+    
+    while match is None:
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.responseReceived':
+                response = params.get('response', {})
+                if params.get('type') == 'Image' and 'fbcdn' in response.get('url', '') and response.get('status') == 200:
+                    responses[params['requestId']] = {'url': response['url'], 'size': 0}
+            elif method == 'Network.loadingFinished' and params.get('requestId') in responses:
+                responses[params['requestId']]['size'] = params.get('encodedDataLength', 0)
+                finished.append(params['requestId'])
+        
+        # The photo's file name embeds its fbid, e.g. 123_<fbid>_456_n.jpg
+        match = next((request_id for request_id in finished if fbid in responses[request_id]['url']), None)
+        if match is None:
+            if time.monotonic() >= deadline:
+                return None, None
+            time.sleep(0.1)
+    
+    image_url = responses[match]['url']
+    try:
+        body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': match})
+        if body.get('base64Encoded'):
+            return image_url, base64.b64decode(body['body'])
+        return image_url, body['body'].encode('latin-1')
+    except WebDriverException as e:
+        logger.warning(f"Could not read image body from Chrome, will download it instead: {str(e)}")
+        return image_url, None
+
+def extract_image_from_metadata(url):
+    """
+    Try to read the photo URL from server-rendered metadata without a browser.
+    
+    Args:
+        url (str): The Facebook photo URL.
+    
+    Returns:
+        str: The image URL, or None if the page does not expose it.
+    """
+    try:
+        response = get_http_session().get(url, headers={'User-Agent': METADATA_USER_AGENT}, timeout=METADATA_TIMEOUT)
+    except requests.RequestException as e:
+        logger.warning(f"Metadata fetch failed: {str(e)}")
+        return None
+    if response.status_code != 200:
+        logger.info(f"Metadata fetch returned status {response.status_code}")
+        return None
+    return pick_metadata_image(response.text, url)
+
+def pick_metadata_image(page_html, url):
+    """Return the photo's fbcdn URL from og:image / embedded JSON in page_html, or None"""
+    candidates = []
+    for match in _OG_IMAGE_RE.finditer(page_html):
+        candidates.append(html.unescape(match.group(1)))
+    for match in _JSON_IMAGE_RE.finditer(page_html):
+        try:
+            candidates.append(json.loads(f'"{match.group(1)}"'))
+        except ValueError:
+            continue
+    
+    # Login walls and error pages carry Facebook's static logo as og:image
+    fbid = extract_fbid(url)
+    for candidate in candidates:
+        if 'fbcdn' not in candidate or 'rsrc.php' in candidate:
+            continue
+        if fbid and fbid not in candidate:
+            continue
+        return candidate
+    return None
+
+@extraction_engine.register('metadata', prior_seconds=0.5, enabled=lambda: METADATA_FAST_PATH)
+def _metadata_strategy(context):
+    return extract_image_from_metadata(context['url'])
+
+@extraction_engine.register('network_capture', needs_browser=True, prior_seconds=0.5,
+                            enabled=lambda: CAPTURE_MODE == 'network')
+def _network_capture_strategy(context):
+    image_url, context['image_bytes'] = capture_image_from_network(context['driver'], context['url'], timeout=PAGE_WAIT_TIMEOUT)
+    return image_url
+
+# Reads every <img> in one round trip instead of one get_attribute() call per element
+_BULK_IMAGE_SCAN_SCRIPT = """
+return Array.prototype.map.call(document.images, function (img) {
+    return {
+        src: img.currentSrc || img.src,
+        media: img.getAttribute('data-visualcompletion') === 'media-vc-image',
+        area: img.naturalWidth * img.naturalHeight
+    };
+});
+"""
+
+@extraction_engine.register('js_bulk_scan', needs_browser=True, prior_seconds=0.1)
+def _js_bulk_scan_strategy(context):
+    return pick_scanned_image(context['driver'].execute_script(_BULK_IMAGE_SCAN_SCRIPT), context['url'])
+
+def pick_scanned_image(images, url):
+    """Choose the photo among the <img> descriptions returned by _BULK_IMAGE_SCAN_SCRIPT"""
+    images = [image for image in images if image['src'] and 'fbcdn' in image['src']]
+    for image in images:
+        if image['media']:
+            return image['src']
+    # The photo's file name embeds its fbid, e.g. 123_<fbid>_456_n.jpg
+    fbid = extract_fbid(url)
+    matching = [image for image in images if fbid and fbid in image['src']]
+    if matching:
+        return max(matching, key=lambda image: image['area'])['src']
+    return None
+
+@extraction_engine.register('css', needs_browser=True, prior_seconds=2.0)
+def _css_strategy(context):
+    driver = context['driver']
+    # Wait for the photo to appear (or the page to settle) instead of sleeping
+    page = wait_for_page(driver, timeout=PAGE_WAIT_TIMEOUT)
+    if not page['src']:
+        # Press ESC key to exit photo viewer
+        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+        
+        # Wait for the page to adjust
+        page = wait_for_page(driver, timeout=PAGE_WAIT_TIMEOUT)
+    logger.info(f"Page wait finished: {page['reason']} after {page['elapsed']:.2f}s")
+    return page['src']
+
+@extraction_engine.register('xpath', needs_browser=True, prior_seconds=5.0)
+def _xpath_strategy(context):
+    # Wait for a visible image element
+    wait = WebDriverWait(context['driver'], 10)
+    try:
+        img_element = wait.until(EC.visibility_of_element_located((By.XPATH, "//img[@data-visualcompletion='media-vc-image'] | //img[contains(@class, 'i09qtzwb')] ")))
+    except (TimeoutException, NoSuchElementException):
+        # No photo on the page (login wall, deleted photo...): not a browser failure
+        return None
+    return img_element.get_attribute('src')
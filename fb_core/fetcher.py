@@ -0,0 +1,161 @@
+"""
+Downloading the located image and writing it to disk
+"""
+import os
+import hashlib
+import logging
+import tempfile
+
+from .config import HTTP_TIMEOUT, IMAGE_CHUNK_SIZE, IMAGE_USER_AGENT, MAX_IMAGE_BYTES
+from .http_client import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the formats Facebook's CDN serves
+_IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif')
+]
+
+def sniff_image_type(head):
+    """Return the image MIME type implied by the first bytes of a file, or None"""
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+def filename_from_url(image_url, default="profile_picture.jpg"):
+    """Use the file name of the CDN URL, e.g. 123_456_789_n.jpg"""
+    return image_url.split("/")[-1].split("?")[0] or default
+
+class _ImageWriter:
+    """Writes chunks to a temp file, hashing and size-checking as it goes"""
+
+    def __init__(self, filepath, temp_dir=None):
+        self.filepath = filepath
+        directory = temp_dir or os.path.dirname(os.path.abspath(filepath))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.content_type = None
+
+    def write(self, chunk):
+        """Append a chunk; returns False once the image is over MAX_IMAGE_BYTES or not an image"""
+        if self.size == 0:
+            self.content_type = sniff_image_type(chunk[:16])
+            if self.content_type is None:
+                logger.error("Downloaded file is not a recognised image")
+                return False
+        self.size += len(chunk)
+        if self.size > MAX_IMAGE_BYTES:
+            logger.error(f"Image is larger than the {MAX_IMAGE_BYTES} byte limit")
+            return False
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+        return True
+
+    def commit(self):
+        """Atomically move the finished file into place"""
+        self.file.close()
+        sha256 = self.sha256.hexdigest()
+        if callable(self.filepath):
+            # Content-addressed target: an existing file already holds these exact bytes
+            filepath = self.filepath(sha256, self.content_type)
+            if os.path.exists(filepath):
+                os.unlink(self.temp_path)
+                return {'path': filepath, 'sha256': sha256, 'size': self.size, 'content_type': self.content_type, 'existing': True}
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        else:
+            filepath = self.filepath
+        os.replace(self.temp_path, filepath)
+        return {'path': filepath, 'sha256': sha256, 'size': self.size, 'content_type': self.content_type, 'existing': False}
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.temp_path)
+        except OSError:
+            pass
+
+def stream_image(image_url, filepath, temp_dir=None):
+    """
+    Stream an image from Facebook's CDN to disk in fixed-size chunks.
+
+    The body is never held in memory as a whole: chunks are hashed and written
+    to a temp file that is renamed over filepath once complete.
+
+    Args:
+        image_url (str): The fbcdn image URL.
+        filepath (str or callable): Where to save the image, or a function of
+            (sha256, content_type) returning that path for content-addressed storage.
+        temp_dir (str): Directory for the partial file; defaults to the target's directory.
+
+    Returns:
+        dict: 'path', 'sha256', 'size', 'content_type' and whether the file was
+            already 'existing', or None if the response was not an acceptable image.
+
+    Raises:
+        requests.RequestException: If the CDN is unreachable after retries.
+    """
+    logger.info(f"Downloading image from: {image_url}")
+    headers = {
+        'User-Agent': IMAGE_USER_AGENT
+    }
+    with get_http_session().get(image_url, headers=headers, timeout=HTTP_TIMEOUT, stream=True) as img_response:
+        if img_response.status_code != 200:
+            logger.error(f"Failed to download image. Status code: {img_response.status_code}")
+            return None
+
+        content_type = img_response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith('image/'):
+            logger.error(f"Refusing to save non-image response: {content_type or 'no content type'}")
+            return None
+
+        declared_size = int(img_response.headers.get('Content-Length') or 0)
+        if declared_size > MAX_IMAGE_BYTES:
+            logger.error(f"Image is larger than the {MAX_IMAGE_BYTES} byte limit ({declared_size} bytes)")
+            return None
+
+        writer = _ImageWriter(filepath, temp_dir)
+        try:
+            for chunk in img_response.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
+                if chunk and not writer.write(chunk):
+                    writer.discard()
+                    return None
+            if writer.size == 0:
+                logger.error("Image response was empty")
+                writer.discard()
+                return None
+            return writer.commit()
+        except BaseException:
+            writer.discard()
+            raise
+
+def write_image(image_bytes, filepath, temp_dir=None):
+    """
+    Save image bytes already in memory (e.g. taken from Chrome) the same way stream_image() does.
+
+    Returns:
+        dict: Same as stream_image(), or None if the bytes are not an acceptable image.
+    """
+    writer = _ImageWriter(filepath, temp_dir)
+    try:
+        view = memoryview(image_bytes)
+        for offset in range(0, len(view), IMAGE_CHUNK_SIZE):
+            if not writer.write(bytes(view[offset:offset + IMAGE_CHUNK_SIZE])):
+                writer.discard()
+                return None
+        if writer.size == 0:
+            writer.discard()
+            return None
+        return writer.commit()
+    except BaseException:
+        writer.discard()
+        raise
@@ -0,0 +1,292 @@
+"""
+Background download jobs: submit returns at once, a worker pool does the browser work
+"""
+import math
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from .errors import DownloadFailed, Overloaded
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    """One submitted download and its progress"""
+
+    def __init__(self, url, client=None):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.client = client
+        self.status = 'queued'  # queued -> running -> done | failed
+        self.result = None
+        self.error = None
+        self.cause = None
+        self.cached = False
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+        self.events = []
+        self._events_changed = threading.Condition()
+        self.add_event('queued')
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def add_event(self, phase, **details):
+        """Record a phase transition and wake anyone streaming this job's events"""
+        event = dict(details, phase=phase, at=time.time())
+        with self._events_changed:
+            self.events.append(event)
+            self._events_changed.notify_all()
+
+    def wait_events(self, since, timeout):
+        """
+        Return events after the first since, waiting up to timeout for one to arrive.
+
+        Returns:
+            list: New events, empty if none arrived in time.
+        """
+        with self._events_changed:
+            self._events_changed.wait_for(lambda: len(self.events) > since, timeout)
+            return self.events[since:]
+
+    def to_dict(self):
+        """Status and timings, safe to return from the API"""
+        now = time.time()
+        timings = {
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'queued_seconds': round((self.started_at or now) - self.submitted_at, 3)
+        }
+        if self.started_at:
+            timings['run_seconds'] = round((self.finished_at or now) - self.started_at, 3)
+        with self._events_changed:
+            phase = self.events[-1]['phase']
+        info = {'id': self.id, 'url': self.url, 'status': self.status, 'phase': phase, 'timings': timings}
+        if self.status == 'failed':
+            info['error'] = self.error
+            info['cause'] = self.cause
+            info['cached'] = self.cached
+        return info
+
+class FairQueue:
+    """
+    Round-robin queue across clients with a per-client concurrency limit.
+
+    Each client has its own FIFO; get() serves clients in turn, skipping
+    those already running max_running jobs. A client pasting URLs in a loop
+    therefore only ever delays others by one job per turn, and cannot hold
+    more than max_running browsers while anyone else is waiting.
+    """
+
+    def __init__(self, max_running):
+        self.max_running = max_running
+        self._queues = OrderedDict()  # client -> deque of jobs, in round-robin order
+        self._running = {}
+        self._cond = threading.Condition()
+
+    def put(self, job):
+        with self._cond:
+            self._queues.setdefault(job.client, deque()).append(job)
+            self._cond.notify()
+
+    def get(self):
+        """Block until some client under its limit has a job, then return that job"""
+        with self._cond:
+            while True:
+                for client, jobs in self._queues.items():
+                    if self._running.get(client, 0) < self.max_running:
+                        job = jobs.popleft()
+                        # Move the client to the back of the rotation
+                        del self._queues[client]
+                        if jobs:
+                            self._queues[client] = jobs
+                        self._running[client] = self._running.get(client, 0) + 1
+                        return job
+                self._cond.wait()
+
+    def task_done(self, job):
+        with self._cond:
+            running = self._running[job.client] - 1
+            if running:
+                self._running[job.client] = running
+            else:
+                del self._running[job.client]
+            self._cond.notify_all()
+
+    def pending(self, client):
+        """Queued plus running jobs of one client"""
+        with self._cond:
+            return len(self._queues.get(client, ())) + self._running.get(client, 0)
+
+    def qsize(self):
+        with self._cond:
+            return sum(len(jobs) for jobs in self._queues.values())
+
+    def stats(self):
+        with self._cond:
+            return {
+                'waiting': sum(len(jobs) for jobs in self._queues.values()),
+                'clients_waiting': len(self._queues),
+                'clients_running': len(self._running),
+                'max_running_per_client': self.max_running
+            }
+
+class JobManager:
+    """
+    Queue of download jobs served by a fixed number of worker threads.
+
+    Capacity is the number of workers, which should match the number of
+    browsers; HTTP threads only submit and poll. Workers take jobs from a
+    FairQueue so clients are served in turn. Finished jobs are kept for
+    result_ttl seconds so clients can collect them.
+
+    Args:
+        handler (callable): Called as handler(url, progress) to do the work and return its
+            result; progress(phase, **details) adds job events, DownloadFailed marks the
+            job failed with its cause.
+        workers (int): Number of worker threads.
+        result_ttl (float): Seconds finished jobs stay queryable.
+        admission (AdmissionController): Bounds queued plus running jobs; None for unbounded.
+        client_concurrency (int): Jobs of one client that may run at once.
+        client_pending (int): Jobs one client may have queued or running; None for no limit.
+    """
+
+    def __init__(self, handler, workers, result_ttl, admission=None, client_concurrency=1, client_pending=None):
+        self.handler = handler
+        self.admission = admission
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.client_pending = client_pending
+        self.jobs = {}
+        self.queue = FairQueue(client_concurrency)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = False
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, url, client=None):
+        """
+        Queue a download and return its Job without waiting for it.
+
+        Args:
+            url (str): The Facebook photo URL.
+            client (str): Key of the requesting client, e.g. its IP address.
+
+        Raises:
+            Overloaded: If the client already has client_pending jobs or admission control refuses the job.
+        """
+        self.start()
+        job = Job(url, client)
+        if self.client_pending is not None:
+            pending = self.queue.pending(client)
+            if pending >= self.client_pending:
+                service_time = self.admission.service_time if self.admission else 1
+                retry_after = max(1, math.ceil(service_time * pending / self.queue.max_running))
+                logger.warning(f"Rejecting job: client already has {pending} pending")
+                raise Overloaded(retry_after, queue_depth=self.queue.qsize())
+        if self.admission:
+            self.admission.try_admit()
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        self.queue.put(job)
+        logger.info(f"Queued job {job.id} ({self.queue.qsize()} waiting)")
+        return job
+
+    def resolved(self, url, client=None, result=None, failure=None):
+        """
+        Register a job answered without running, e.g. from a cache, so it can be polled like any other.
+        
+        Args:
+            url (str): The Facebook photo URL.
+            client (str): Key of the requesting client.
+            result: The job's result, when it succeeded.
+            failure (DownloadFailed): Why it failed, when it did.
+        """
+        job = Job(url, client)
+        job.started_at = job.finished_at = job.submitted_at
+        if failure:
+            job.error = failure.message
+            job.cause = failure.cause
+            job.cached = failure.cached
+            job.status = 'failed'
+            job.add_event('failed', error=job.error, cause=job.cause)
+        else:
+            job.result = result
+            job.status = 'done'
+            job.add_event('done')
+        job.done.set()
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        return job
+    
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _prune(self):
+        # Called with the lock held
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._run(job)
+            finally:
+                self.queue.task_done(job)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        job.add_event('running')
+        try:
+            job.result = self.handler(job.url, job.add_event)
+            job.status = 'done'
+        except DownloadFailed as e:
+            job.error = e.message
+            job.cause = e.cause
+            job.cached = e.cached
+            job.status = 'failed'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.error = f'An error occurred: {str(e)}'
+            job.cause = 'error'
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            if self.admission:
+                self.admission.release(job.finished_at - job.started_at)
+            if job.status == 'done':
+                job.add_event('done')
+            else:
+                job.add_event('failed', error=job.error, cause=job.cause)
+            job.done.set()
+        logger.info(f"Job {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return dict(self.queue.stats(), workers=self.workers, jobs=counts)
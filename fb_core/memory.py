@@ -0,0 +1,185 @@
+"""
+Memory governor: keeps Chrome inside the container's memory limit
+"""
+import os
+import logging
+import threading
+import weakref
+
+from .config import BROWSER_MAX_NAVIGATIONS, BROWSER_MAX_RSS_MB, MEMORY_ADMIT_RATIO
+from .reaper import descendants, process_table
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# cgroup v1 reports "no limit" as a number close to 2**63
+_UNLIMITED = 2 ** 60
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    if not value.isdigit() or int(value) >= _UNLIMITED:
+        # 'max' in cgroup v2
+        return None
+    return int(value)
+
+def _read_stat(path, name):
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if fields and fields[0] == name:
+                    return int(fields[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def _cgroup_dirs():
+    """(version, directory) pairs of this process's memory cgroup and its ancestors, innermost first"""
+    try:
+        with open('/proc/self/cgroup') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    for line in lines:
+        _, controllers, path = line.split(':', 2)
+        if controllers == '':
+            version, base = 2, CGROUP_ROOT
+        elif 'memory' in controllers.split(','):
+            version, base = 1, os.path.join(CGROUP_ROOT, 'memory')
+        else:
+            continue
+        dirs = []
+        path = path.rstrip('/')
+        while True:
+            directory = base + path
+            if os.path.isdir(directory):
+                dirs.append((version, directory))
+            if not path:
+                return dirs
+            path = path.rsplit('/', 1)[0]
+    return []
+
+def container_memory():
+    """
+    Memory limit and working set of the container this process runs in.
+
+    Reads the cgroup (v2 memory.max/memory.current, or v1 memory.limit_in_bytes/
+    memory.usage_in_bytes), using the tightest limit among the cgroup and its
+    ancestors; without a cgroup limit, falls back to /proc/meminfo. The working
+    set leaves out inactive page cache, which the kernel reclaims before it
+    OOM-kills anything.
+
+    Returns:
+        tuple: (limit_bytes, used_bytes), or (None, None) where neither is available.
+    """
+    tightest = None
+    for version, directory in _cgroup_dirs():
+        if version == 2:
+            limit = _read_int(os.path.join(directory, 'memory.max'))
+            usage = _read_int(os.path.join(directory, 'memory.current'))
+            inactive = _read_stat(os.path.join(directory, 'memory.stat'), 'inactive_file')
+        else:
+            limit = _read_int(os.path.join(directory, 'memory.limit_in_bytes'))
+            usage = _read_int(os.path.join(directory, 'memory.usage_in_bytes'))
+            inactive = _read_stat(os.path.join(directory, 'memory.stat'), 'total_inactive_file')
+        if limit and usage is not None and (tightest is None or limit < tightest[0]):
+            tightest = (limit, max(0, usage - inactive))
+    if tightest:
+        return tightest
+
+    total = _read_stat('/proc/meminfo', 'MemTotal:')
+    available = _read_stat('/proc/meminfo', 'MemAvailable:')
+    if not total:
+        return None, None
+    return total * 1024, (total - available) * 1024
+
+def process_tree_rss(pid):
+    """Resident memory of a process and all its children, in bytes (0 if it is gone)"""
+    table = process_table()
+    if pid not in table:
+        return 0
+    return sum(table[member]['rss'] for member in {pid} | descendants(table, {pid}))
+
+class MemoryGovernor:
+    """
+    Retires browsers before they grow too large and refuses work near the memory limit.
+
+    Chrome's footprint creeps up over a long session, and on a small container
+    one browser plus the web process already sits close to the ceiling. The
+    pool asks should_recycle() each time a session comes back: the session is
+    quit instead of reused once it has served max_navigations pages or its
+    process tree holds more than max_rss bytes. AdmissionController asks
+    under_pressure() before admitting a download, which is true once the
+    container's working set reaches admit_ratio of its limit.
+
+    Args:
+        max_rss (int): Resident bytes of one browser's process tree before it is recycled; 0 for no limit.
+        max_navigations (int): Page loads one browser serves before it is recycled; 0 for no limit.
+        admit_ratio (float): Share of the memory limit past which new downloads are refused; 0 to never refuse.
+    """
+
+    def __init__(self, max_rss, max_navigations, admit_ratio):
+        self.max_rss = max_rss
+        self.max_navigations = max_navigations
+        self.admit_ratio = admit_ratio
+        self.recycled = {'rss': 0, 'navigations': 0}
+        self._navigations = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def should_recycle(self, session, pid):
+        """
+        Count one page load for a session and decide whether to retire it.
+
+        Args:
+            session: The browser session object, e.g. a WebDriver.
+            pid (int): Root of the session's process tree (ChromeDriver), or None if unknown.
+
+        Returns:
+            bool: True if the session should be quit rather than reused.
+        """
+        with self._lock:
+            navigations = self._navigations.get(session, 0) + 1
+            self._navigations[session] = navigations
+
+        reason = None
+        if self.max_navigations and navigations >= self.max_navigations:
+            reason = 'navigations'
+            logger.info(f"Recycling browser after {navigations} page loads")
+        elif self.max_rss and pid:
+            rss = process_tree_rss(pid)
+            if rss > self.max_rss:
+                reason = 'rss'
+                logger.info(f"Recycling browser using {rss / (1024 * 1024):.0f} MB after {navigations} page loads")
+        if not reason:
+            return False
+        with self._lock:
+            self.recycled[reason] += 1
+        return True
+
+    def under_pressure(self):
+        """Whether the container's working set has reached admit_ratio of its memory limit"""
+        if not self.admit_ratio:
+            return False
+        limit, used = container_memory()
+        return bool(limit) and used >= limit * self.admit_ratio
+
+    def stats(self):
+        limit, used = container_memory()
+        with self._lock:
+            recycled = dict(self.recycled)
+        return {
+            'limit_mb': round(limit / (1024 * 1024)) if limit else None,
+            'used_mb': round(used / (1024 * 1024)) if limit else None,
+            'admit_ratio': self.admit_ratio,
+            'under_pressure': bool(limit and self.admit_ratio and used >= limit * self.admit_ratio),
+            'browser_max_rss_mb': round(self.max_rss / (1024 * 1024)),
+            'browser_max_navigations': self.max_navigations,
+            'recycled': recycled
+        }
+
+memory_governor = MemoryGovernor(BROWSER_MAX_RSS_MB * 1024 * 1024, BROWSER_MAX_NAVIGATIONS, MEMORY_ADMIT_RATIO)
@@ -0,0 +1,124 @@
+"""
+End-to-end download: locate the photo, fetch it and store it
+"""
+import os
+import logging
+
+from .errors import DownloadFailed
+from .extractor import _no_progress, extraction_engine
+from .fetcher import filename_from_url, stream_image, write_image
+from .urls import normalize_photo_url
+
+logger = logging.getLogger(__name__)
+
+def download_profile_picture(url, output_dir, filename=None, failure_screenshot=None, engine=None):
+    """
+    Download a Facebook profile picture, trying the cheapest working strategy first.
+    
+    Args:
+        url (str): The Facebook photo URL.
+        output_dir (str): Directory to save the downloaded image.
+        filename (str): File name to save under; defaults to the CDN file name.
+        failure_screenshot (str): Where to save a screenshot of the page if the photo is not found.
+        engine (ExtractionEngine): Engine to use instead of the shared one.
+    
+    Returns:
+        str: Path to the downloaded image or None if failed.
+    
+    Raises:
+        Exception: If Chrome cannot be started; WebDriver errors during extraction are handled.
+    """
+    key, canonical_url = normalize_photo_url(url)
+    logger.info(f"Downloading {key}")
+    engine = engine or extraction_engine
+    try:
+        profile_img_url, image_bytes = engine.run(canonical_url, failure_screenshot=failure_screenshot)
+    except DownloadFailed as e:
+        logger.error(f"Could not find profile image URL: {e.message}")
+        return None
+    
+    filepath = os.path.join(output_dir, filename or filename_from_url(profile_img_url))
+    if image_bytes is not None:
+        saved = write_image(image_bytes, filepath)
+    else:
+        saved = stream_image(profile_img_url, filepath)
+    if not saved:
+        return None
+    
+    logger.info(f"Saved {saved['size']} byte {saved['content_type']} (sha256 {saved['sha256'][:12]}) to {saved['path']}")
+    return saved['path']
+
+def download_to_store(url, store, engine=None, cache=None, negative_cache=None, flights=None, progress=None):
+    """
+    Locate the photo and put it in a content-addressed ImageStore.
+    
+    Args:
+        url (str): The Facebook photo URL.
+        store (ImageStore): Where to keep the image.
+        engine (ExtractionEngine): Engine to use instead of the shared one.
+        cache (ResultCache): Answer repeat requests for the same photo without touching the browser.
+        negative_cache (NegativeCache): Fail fast for photos that recently failed.
+        flights (SingleFlight): Share one browser run between concurrent requests for the same photo.
+        progress (callable): Called as progress(phase, **details) as the download advances:
+            'cache_hit', then the engine's phases, 'fetched' and 'stored'.
+    
+    Returns:
+        dict: The store record ('sha256', 'path', 'content_type', 'size').
+    
+    Raises:
+        DownloadFailed: If the photo could not be downloaded, possibly answered from negative_cache.
+        Exception: If Chrome cannot be started.
+    """
+    # Equivalent URLs (m./www., photo.php, tracking parameters...) share one key
+    key, canonical_url = normalize_photo_url(url)
+    if cache:
+        record = cache.get(key)
+        if record:
+            logger.info(f"Result cache hit for {key}")
+            if progress:
+                progress('cache_hit')
+            return record
+    if negative_cache:
+        failure = negative_cache.get(key)
+        if failure:
+            logger.info(f"Negative cache hit for {key}: {failure.cause}")
+            raise failure
+    
+    def download():
+        try:
+            record = _locate_and_store(key, canonical_url, store, engine or extraction_engine, progress or _no_progress)
+        except DownloadFailed as e:
+            logger.error(f"Download of {key} failed ({e.cause}): {e.message}")
+            if negative_cache:
+                negative_cache.put(key, e)
+            raise
+        # Cached before the flight ends so callers arriving afterwards hit the cache
+        if cache:
+            cache.put(key, record)
+        return record
+    
+    if flights:
+        return flights.do(key, download)
+    return download()
+
+def _locate_and_store(key, canonical_url, store, engine, progress):
+    logger.info(f"Downloading {key} from {canonical_url}")
+    profile_img_url, image_bytes = engine.run(canonical_url, progress=progress)
+    
+    # The same CDN URL was downloaded before; its file is still in the store
+    record = store.lookup(profile_img_url)
+    if record:
+        logger.info(f"Image {record['sha256'][:12]} already stored for this CDN URL")
+    else:
+        if image_bytes is not None:
+            record = store.save_bytes(image_bytes)
+        else:
+            record = store.save_from_url(profile_img_url)
+        if not record:
+            raise DownloadFailed('fetch_failed', 'The image could not be downloaded from Facebook.')
+        progress('fetched', size=record['size'], content_type=record['content_type'])
+        
+        store.remember(profile_img_url, record)
+        logger.info(f"Stored {record['size']} byte {record['content_type']} as {record['sha256'][:12]}")
+    progress('stored', content_type=record['content_type'])
+    return record
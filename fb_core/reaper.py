@@ -0,0 +1,226 @@
+"""
+Reaper for Chrome and ChromeDriver processes that no live session owns any more
+"""
+import os
+import re
+import time
+import signal
+import logging
+import threading
+import weakref
+
+from .config import REAPER_GRACE, REAPER_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+_BROWSER_NAME_RE = re.compile(r'chrom|headless_shell', re.IGNORECASE)
+
+# Switches only automated browsers are launched with; someone's own Chrome never has them
+_AUTOMATION_SWITCHES = ('--enable-automation', '--remote-debugging-port', '--test-type=webdriver')
+
+def process_table():
+    """
+    Snapshot of every process in /proc.
+
+    Returns:
+        dict: pid -> {'pid', 'ppid', 'name', 'state', 'started', 'rss', 'cmdline'}, with rss
+            in bytes and started in clock ticks since boot. Empty where /proc does not exist.
+    """
+    table = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return table
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read().decode('utf-8', 'replace')
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                cmdline = f.read().decode('utf-8', 'replace').split('\0')
+        except OSError:
+            # Exited while we were looking
+            continue
+        # The name is in parentheses and may itself contain spaces or parentheses
+        fields = stat[stat.rindex(')') + 2:].split()
+        table[int(entry)] = {
+            'pid': int(entry),
+            'ppid': int(fields[1]),
+            'name': stat[stat.index('(') + 1:stat.rindex(')')],
+            'state': fields[0],
+            'started': int(fields[19]),
+            'rss': int(fields[21]) * _PAGE_SIZE,
+            'cmdline': [argument for argument in cmdline if argument]
+        }
+    return table
+
+def descendants(table, pids):
+    """Every process below the given pids in a process_table() snapshot"""
+    children = {}
+    for info in table.values():
+        children.setdefault(info['ppid'], []).append(info['pid'])
+    found = set()
+    stack = list(pids)
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            if child not in found:
+                found.add(child)
+                stack.append(child)
+    return found
+
+def is_browser(info):
+    """Whether a process_table() entry is Chrome, Chromium, ChromeDriver or one of their helpers"""
+    executable = os.path.basename(info['cmdline'][0]) if info['cmdline'] else ''
+    return bool(_BROWSER_NAME_RE.search(info['name']) or _BROWSER_NAME_RE.search(executable))
+
+def _is_automated(info):
+    return 'driver' in info['name'].lower() or any(
+        argument.startswith(_AUTOMATION_SWITCHES) for argument in info['cmdline'])
+
+class ProcessReaper:
+    """
+    Periodically kills browser processes left behind by sessions that were never quit.
+
+    Sessions register their ChromeDriver (or Chrome) pid with track(); that
+    process and everything below it is left alone while the owning object is
+    alive and not untracked. Anything else that looks like ours is a suspect:
+    browser processes started directly by this process, and automated browsers
+    re-parented to init after their parent died (gunicorn killing a timed-out
+    worker, a crash between launch and quit). A suspect still there after
+    grace seconds is killed with its children. Zombie browser children of this
+    process are reaped on every scan.
+
+    Args:
+        interval (float): Seconds between scans; 0 disables the background thread.
+        grace (float): Seconds a process must look orphaned before it is killed.
+    """
+
+    def __init__(self, interval, grace):
+        self.interval = interval
+        self.grace = grace
+        self.scans = 0
+        self.killed = 0
+        self.reaped = 0
+        self.reclaimed_bytes = 0
+        self.last_scan_at = None
+        self._owners = {}  # pid -> weak reference to the session object owning it
+        self._suspects = {}  # (pid, start time) -> monotonic time first seen orphaned
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track(self, pid, owner):
+        """Protect pid and its children for as long as owner is alive and not untracked"""
+        with self._lock:
+            self._owners[pid] = weakref.ref(owner)
+
+    def untrack(self, pid):
+        """Stop protecting pid, e.g. right before quitting its session"""
+        with self._lock:
+            self._owners.pop(pid, None)
+
+    def start(self):
+        """Start the background scan thread (idempotent; a no-op without /proc or with interval 0)"""
+        with self._lock:
+            if self._thread or self.interval <= 0:
+                return
+            if not os.path.isdir('/proc'):
+                logger.info("No /proc on this system; orphaned browser reaper disabled")
+                return
+            self._thread = threading.Thread(target=self._run, name='process-reaper', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.scan()
+            except Exception as e:
+                logger.warning(f"Orphaned browser scan failed: {str(e)}")
+
+    def scan(self):
+        """
+        Reap zombie browser children and kill orphans past their grace period.
+
+        Returns:
+            int: Processes killed or reaped by this scan.
+        """
+        table = process_table()
+        me = os.getpid()
+        now = time.monotonic()
+        with self._lock:
+            self._owners = {pid: owner for pid, owner in self._owners.items()
+                            if owner() is not None and pid in table}
+            owned = set(self._owners)
+
+        reaped = self._reap_zombies(table, me)
+        protected = owned | descendants(table, owned)
+        roots = {
+            pid for pid, info in table.items()
+            if pid not in protected and info['state'] != 'Z' and is_browser(info)
+            and (info['ppid'] == me or (info['ppid'] == 1 and _is_automated(info)))
+        }
+
+        killed = 0
+        suspects = {}
+        for pid in roots:
+            key = (pid, table[pid]['started'])
+            suspects[key] = first_seen = self._suspects.get(key, now)
+            if now - first_seen >= self.grace:
+                killed += self._kill_tree(table, pid)
+                del suspects[key]
+        self._suspects = suspects
+
+        self.scans += 1
+        self.last_scan_at = time.time()
+        return reaped + killed
+
+    def _reap_zombies(self, table, me):
+        reaped = 0
+        for pid, info in table.items():
+            # Only browsers: reaping other children would hide their exit from multiprocessing
+            if info['state'] == 'Z' and info['ppid'] == me and is_browser(info):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        reaped += 1
+                except ChildProcessError:
+                    pass
+        if reaped:
+            self.reaped += reaped
+            logger.info(f"Reaped {reaped} zombie browser process(es)")
+        return reaped
+
+    def _kill_tree(self, table, pid):
+        killed = 0
+        freed = 0
+        for target in [pid] + sorted(descendants(table, {pid})):
+            try:
+                os.kill(target, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                continue
+            killed += 1
+            freed += table[target]['rss']
+        self.killed += killed
+        self.reclaimed_bytes += freed
+        if killed:
+            logger.warning(f"Killed orphaned {table[pid]['name']} (pid {pid}) and {killed - 1} child process(es), "
+                           f"freeing {freed / (1024 * 1024):.0f} MB")
+        return killed
+
+    def stats(self):
+        with self._lock:
+            tracked = len(self._owners)
+        return {
+            'running': self._thread is not None,
+            'tracked_sessions': tracked,
+            'suspects': len(self._suspects),
+            'scans': self.scans,
+            'orphans_killed': self.killed,
+            'zombies_reaped': self.reaped,
+            'reclaimed_mb': round(self.reclaimed_bytes / (1024 * 1024), 1),
+            'last_scan_at': self.last_scan_at
+        }
+
+process_reaper = ProcessReaper(REAPER_INTERVAL, REAPER_GRACE)
@@ -0,0 +1,74 @@
+"""
+Coalescing of concurrent identical work: one caller runs it, the rest share the result
+"""
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    In-flight registry keyed by canonical photo URL.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running (followers) wait on the leader's future and
+    receive the same return value or exception. The key is forgotten as soon
+    as the leader finishes, so later callers start fresh (and normally hit the
+    result cache the leader just filled).
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, func, timeout=None):
+        """
+        Run func() once for all concurrent callers with the same key.
+
+        Args:
+            key (str): The coalescing key.
+            func (callable): Work to run if no call for key is in flight.
+            timeout (float): Longest a follower waits for the leader; None waits forever.
+
+        Returns:
+            The leader's return value.
+
+        Raises:
+            Whatever func() raised in the leader.
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._flights[key] = future
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            logger.info(f"Joining in-flight download of {key}")
+            return future.result(timeout)
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'followers': self.followers
+            }
@@ -0,0 +1,162 @@
+"""
+Content-addressed image store with a URL-to-hash index
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from urllib.parse import urlsplit
+
+from .fetcher import stream_image, write_image
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp'
+}
+
+class ImageStore:
+    """
+    Images stored once per SHA-256 of their bytes, plus an index from URLs to hashes.
+
+    Files are only ever created by atomic rename and never rewritten, so they
+    are safe to read while other downloads are being written.
+
+    Layout under root:
+        objects/ab/abcdef....jpg   image files named by content hash
+        index/<sha256 of url>.json URL -> image record
+        tmp/                       partial downloads
+
+    Nothing is deleted on write; prune() drops old index entries and the images
+    nothing refers to any more.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.index_dir = os.path.join(self.root, 'index')
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+        for directory in (self.objects_dir, self.index_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, sha256, content_type):
+        """Where the image with this hash lives"""
+        return os.path.join(self.objects_dir, sha256[:2], sha256 + _EXTENSIONS.get(content_type, '.img'))
+
+    def save_from_url(self, image_url):
+        """Stream an image into the store; returns its record or None"""
+        return self.record_saved(stream_image(image_url, self.path_for, temp_dir=self.tmp_dir))
+
+    def save_bytes(self, image_bytes):
+        """Store image bytes already in memory; returns its record or None"""
+        return self.record_saved(write_image(image_bytes, self.path_for, temp_dir=self.tmp_dir))
+
+    def record_saved(self, saved):
+        """Turn the result of stream_image()/write_image() into a store record, or None"""
+        if not saved:
+            return None
+        if saved['existing']:
+            logger.info(f"Image {saved['sha256'][:12]} already stored, reusing it")
+        return {
+            'sha256': saved['sha256'],
+            'path': os.path.relpath(saved['path'], self.root),
+            'content_type': saved['content_type'],
+            'size': saved['size']
+        }
+
+    def _index_path(self, url):
+        parts = urlsplit(url)
+        if 'fbcdn' in (parts.hostname or ''):
+            # fbcdn signs image URLs with oh/oe/_nc_* parameters that change on every
+            # fetch, and serves the same path from many hosts; the path names the image
+            url = parts.path
+        return os.path.join(self.index_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def remember(self, url, record):
+        """Point url at a stored image"""
+        entry = dict(record, url=url, stored_at=time.time())
+        fd, temp_path = tempfile.mkstemp(dir=self.tmp_dir, prefix='.', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._index_path(url))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def lookup(self, url):
+        """Return the record url points at, or None if unknown or the file is gone"""
+        try:
+            with open(self._index_path(url)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.absolute_path(entry)):
+            return None
+        return entry
+
+    def prune(self, max_age, keep=()):
+        """
+        Delete index entries older than max_age, then images older than max_age
+        that no remaining index entry and no hash in keep refers to.
+
+        Args:
+            max_age (float): Seconds an index entry or unreferenced image is kept.
+            keep (iterable): SHA-256 hashes still in use elsewhere, e.g. by the result cache.
+
+        Returns:
+            int: Files deleted.
+        """
+        cutoff = time.time() - max_age
+        keep = set(keep)
+        deleted = 0
+
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.unlink(path)
+                    deleted += 1
+                    continue
+                with open(path) as f:
+                    keep.add(json.load(f)['sha256'])
+            except (OSError, ValueError, KeyError):
+                continue
+
+        for directory, _, names in os.walk(self.objects_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                if os.path.splitext(name)[0] in keep:
+                    continue
+                try:
+                    if os.path.getmtime(path) <= cutoff:
+                        os.unlink(path)
+                        deleted += 1
+                except OSError:
+                    continue
+
+        # Partial downloads abandoned by a killed worker
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.unlink(path)
+                    deleted += 1
+            except OSError:
+                continue
+
+        if deleted:
+            logger.info(f"Pruned {deleted} old index entries and images from the store")
+        return deleted
+
+    def absolute_path(self, record):
+        """Absolute path of a record's image file"""
+        return os.path.join(self.root, record['path'])
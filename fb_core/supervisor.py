@@ -0,0 +1,292 @@
+"""
+Browser worker processes: each owns one Chrome, so a crash or hang never takes the web tier down
+"""
+import os
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+
+from .driver import driver_pool, warm_up
+from .errors import DownloadFailed
+from .extractor import _no_progress, extraction_engine
+from .reaper import process_reaper
+
+logger = logging.getLogger(__name__)
+
+def _worker_main(conn):
+    """Entry point of a browser worker process: run extractions sent over conn until told to stop"""
+    if hasattr(os, 'setsid'):
+        # Own process group, so the supervisor can kill this worker together with its Chrome
+        os.setsid()
+    logging.basicConfig(level=logging.INFO, format=f'[browser-worker {os.getpid()}] %(message)s')
+
+    # One Chrome per worker process; the supervisor decides how many workers there are
+    driver_pool.size = 1
+    process_reaper.start()
+    warm_up()
+    conn.send(('ready',))
+
+    while True:
+        try:
+            url = conn.recv()
+        except EOFError:
+            break
+        if url is None:
+            break
+
+        def progress(phase, **details):
+            conn.send(('progress', phase, details))
+
+        try:
+            image_url, image_bytes = extraction_engine.run(url, progress=progress)
+            reply = ('result', image_url, image_bytes)
+        except DownloadFailed as e:
+            reply = ('failed', e.cause, e.message)
+        except Exception as e:
+            reply = ('error', str(e))
+        # Strategy statistics live in this process; the supervisor reports them for /stats
+        conn.send(('stats', extraction_engine.stats()))
+        conn.send(reply)
+    driver_pool.close()
+
+class _Worker:
+    """Supervisor-side state of one worker slot"""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.state = 'stopped'  # stopped -> starting -> idle <-> busy, or backoff after a crash
+        self.started_at = 0
+        self.restart_at = 0
+        self.failures = 0
+        self.restarts = 0
+        self.jobs = 0
+        self.strategy_stats = None  # last ExtractionEngine.stats() of the current process
+
+class BrowserSupervisor:
+    """
+    Runs N browser worker processes and hands them extraction jobs over pipes.
+
+    Has the same run() interface as ExtractionEngine, so it can be passed to
+    download_to_store() as the engine. A worker that exits, stops answering
+    within job_timeout, or fails to start is killed with its whole process
+    group and restarted after an exponential backoff; the job it was running
+    is retried on another worker up to max_retries times.
+
+    Args:
+        workers (int): Number of worker processes, one Chrome each.
+        job_timeout (float): Seconds a worker may spend on one job before it counts as hung.
+        max_retries (int): Times a job is retried on another worker after its worker died.
+        backoff (float): First restart delay in seconds, doubled per consecutive failure.
+        max_backoff (float): Longest restart delay.
+    """
+
+    def __init__(self, workers, job_timeout, max_retries=1, backoff=1.0, max_backoff=60.0):
+        self.job_timeout = job_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retried = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [_Worker(index) for index in range(workers)]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._monitor = None
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    def start(self):
+        """Launch every worker and the monitor thread that restarts crashed ones"""
+        with self._cond:
+            if self._monitor:
+                return
+            for worker in self._workers:
+                self._spawn(worker)
+            self._monitor = threading.Thread(target=self._watch, name='browser-supervisor', daemon=True)
+            self._monitor.start()
+
+    def _spawn(self, worker):
+        # Called with the lock held
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn,),
+                                        name=f'browser-worker-{worker.index}', daemon=True)
+        process.start()
+        child_conn.close()
+        worker.process, worker.conn, worker.state = process, parent_conn, 'starting'
+        worker.strategy_stats = None
+        worker.started_at = time.monotonic()
+        logger.info(f"Started browser worker {worker.index} (pid {process.pid})")
+
+    def _kill(self, worker, reason):
+        """Kill a worker and its Chrome, and schedule its restart with backoff"""
+        # Called with the lock held
+        process = worker.process
+        if process and process.is_alive():
+            try:
+                if hasattr(os, 'killpg'):
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+            except OSError:
+                process.kill()
+        if process:
+            process.join(timeout=5)
+        if worker.conn:
+            worker.conn.close()
+        worker.process = worker.conn = None
+        delay = min(self.max_backoff, self.backoff * 2 ** worker.failures)
+        worker.failures += 1
+        worker.state = 'backoff'
+        worker.restart_at = time.monotonic() + delay
+        logger.warning(f"Browser worker {worker.index} {reason}; restarting in {delay:.1f}s")
+
+    def _watch(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                for worker in self._workers:
+                    if worker.state == 'starting' and worker.conn.poll():
+                        try:
+                            message = worker.conn.recv()
+                        except (EOFError, OSError):
+                            message = None
+                        if message == ('ready',):
+                            worker.state = 'idle'
+                            self._cond.notify_all()
+                    if worker.state in ('starting', 'idle') and not worker.process.is_alive():
+                        self._kill(worker, f"exited with code {worker.process.exitcode}")
+                    elif worker.state == 'starting' and now - worker.started_at > self.job_timeout:
+                        self._kill(worker, f"did not start within {self.job_timeout:.0f}s")
+                    elif worker.state == 'backoff' and now >= worker.restart_at:
+                        worker.restarts += 1
+                        self._spawn(worker)
+            time.sleep(0.5)
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser supervisor is closed")
+                for worker in self._workers:
+                    if worker.state == 'idle':
+                        worker.state = 'busy'
+                        return worker
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No browser worker became free within {timeout}s")
+                self._cond.wait(remaining)
+
+    def _release(self, worker, ok):
+        with self._cond:
+            if ok:
+                worker.state = 'idle'
+                worker.failures = 0
+                worker.jobs += 1
+            self._cond.notify_all()
+
+    def _run_on(self, worker, url, progress):
+        """Run one job on a worker; returns the worker's final message, or None if it died or hung"""
+        deadline = time.monotonic() + self.job_timeout
+        try:
+            worker.conn.send(url)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    reason = f"hung for {self.job_timeout:.0f}s"
+                    break
+                message = worker.conn.recv()
+                if message[0] == 'progress':
+                    progress(message[1], **message[2])
+                elif message[0] == 'stats':
+                    worker.strategy_stats = message[1]
+                else:
+                    return message
+        except (EOFError, OSError) as e:
+            reason = f"died mid-job ({e.__class__.__name__})"
+        with self._cond:
+            self._kill(worker, reason)
+        return None
+
+    def run(self, url, failure_screenshot=None, progress=None):
+        """
+        Locate the photo in a worker process.
+
+        Args:
+            url (str): The Facebook photo URL.
+            failure_screenshot (str): Not supported across processes; ignored.
+            progress (callable): Called as progress(phase, **details) with the worker's phases.
+
+        Returns:
+            tuple: (image_url, image_bytes), as ExtractionEngine.run().
+
+        Raises:
+            DownloadFailed: If the photo was not found, or every attempt lost its worker.
+        """
+        self.start()
+        progress = progress or _no_progress
+        for attempt in range(self.max_retries + 1):
+            worker = self._acquire(self.job_timeout)
+            message = self._run_on(worker, url, progress)
+            self._release(worker, ok=message is not None)
+            if message is None:
+                if attempt < self.max_retries:
+                    self.retried += 1
+                    logger.info(f"Retrying {url} on another browser worker")
+                continue
+            if message[0] == 'result':
+                return message[1], message[2]
+            if message[0] == 'failed':
+                raise DownloadFailed(message[1], message[2])
+            raise RuntimeError(message[1])
+        raise DownloadFailed('browser_error', 'The browser failed while loading the photo.')
+
+    def capacity(self):
+        """Workers able to take a job now: idle or busy ones, plus first starts that have not failed yet"""
+        with self._cond:
+            return sum(1 for worker in self._workers
+                       if worker.state in ('idle', 'busy') or (worker.state == 'starting' and not worker.failures))
+
+    def close(self):
+        """Stop every worker"""
+        with self._cond:
+            self._closed = True
+            for worker in self._workers:
+                if worker.conn:
+                    try:
+                        worker.conn.send(None)
+                    except OSError:
+                        pass
+            self._cond.notify_all()
+        for worker in self._workers:
+            if worker.process:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    with self._cond:
+                        self._kill(worker, "did not stop")
+
+    def strategy_stats(self):
+        """Extraction strategy statistics of each worker that has run a job, by worker index"""
+        with self._cond:
+            return {str(worker.index): worker.strategy_stats for worker in self._workers if worker.strategy_stats}
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': [{
+                    'index': worker.index,
+                    'pid': worker.process.pid if worker.process else None,
+                    'state': worker.state,
+                    'jobs': worker.jobs,
+                    'restarts': worker.restarts,
+                    'consecutive_failures': worker.failures
+                } for worker in self._workers],
+                'retried_jobs': self.retried
+            }
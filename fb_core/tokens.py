@@ -0,0 +1,52 @@
+"""
+Opaque, expiring handles to downloaded images
+"""
+import os
+import logging
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+logger = logging.getLogger(__name__)
+
+class ResultTokens:
+    """
+    Signed tokens naming one image store record.
+
+    The token carries the record itself, signed with secret and stamped with
+    its issue time, so any worker sharing the store and the secret can
+    resolve it without shared state. Tokens older than max_age are refused.
+    """
+
+    def __init__(self, store, secret, max_age):
+        self.store = store
+        self.max_age = max_age
+        self.serializer = URLSafeTimedSerializer(secret, salt='result-token')
+
+    def issue(self, record):
+        """Return a token for a store record"""
+        return self.serializer.dumps({
+            'sha256': record['sha256'],
+            'path': record['path'],
+            'content_type': record['content_type']
+        })
+
+    def resolve(self, token):
+        """
+        Return the absolute image path a token refers to.
+
+        Returns:
+            str: The image path, or None if the token is invalid, expired or
+                its image has been removed from the store.
+        """
+        try:
+            record = self.serializer.loads(token, max_age=self.max_age)
+        except SignatureExpired:
+            logger.info("Refusing expired result token")
+            return None
+        except BadSignature:
+            logger.warning("Refusing result token with a bad signature")
+            return None
+        filepath = self.store.absolute_path(record)
+        if not os.path.exists(filepath):
+            return None
+        return filepath
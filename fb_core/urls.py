@@ -0,0 +1,70 @@
+"""
+Canonical form of Facebook photo URLs, used as the key for caching and deduplication
+"""
+import re
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+# Hosts that all serve the same photo pages
+_FACEBOOK_HOSTS = {
+    'facebook.com', 'www.facebook.com', 'm.facebook.com', 'mbasic.facebook.com',
+    'web.facebook.com', 'touch.facebook.com', 'mobile.facebook.com', 'fb.com', 'www.fb.com'
+}
+
+# Query parameters that only carry tracking or UI state
+_TRACKING_PARAMS = {
+    '__cft__', '__tn__', '__xts__', 'mibextid', 'ref', 'refid', 'ref_type', '_rdr', '_rdc',
+    'rdid', 'share_url', 'paipv', 'eav', 'hc_ref', 'fref', 'notif_id', 'notif_t', 'comment_id',
+    'type', 'theater', 'app', 'source', 'sfnsn', 'extid', 'idorvanity', 'locale'
+}
+
+# /<user>/photos/a.<album>/<photo id>/ and /<user>/photos/<photo id>/
+_PHOTOS_PATH_RE = re.compile(r'^/[^/]+/photos/(?:[^/]+/)?(\d+)/?$')
+
+def normalize_photo_url(url):
+    """
+    Reduce a Facebook photo URL to a stable key and a canonical URL to navigate to.
+
+    photo/?fbid=…&set=…, photo.php?fbid=…, /<user>/photos/…/<id>/, the m./mbasic./web.
+    hosts and tracking parameters all collapse onto the same key.
+
+    Args:
+        url (str): The URL as submitted.
+
+    Returns:
+        tuple: (key, canonical_url), e.g. ('photo:105948795901555',
+            'https://www.facebook.com/photo/?fbid=105948795901555&set=a.105948809234887').
+            URLs that are not recognised photo pages get a 'url:' key built from
+            the URL with tracking parameters removed.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+              if name not in _TRACKING_PARAMS and not name.startswith('__')]
+    query = dict(params)
+
+    if host in _FACEBOOK_HOSTS:
+        path = parts.path or '/'
+        fbid = None
+        if path.rstrip('/') in ('/photo', '/photo.php'):
+            fbid = query.get('fbid')
+        else:
+            match = _PHOTOS_PATH_RE.match(path)
+            if match:
+                fbid = match.group(1)
+
+        if fbid and fbid.isdigit():
+            canonical_query = {'fbid': fbid}
+            if query.get('set'):
+                canonical_query['set'] = query['set']
+            return f"photo:{fbid}", f"https://www.facebook.com/photo/?{urlencode(canonical_query)}"
+
+        canonical = f"https://www.facebook.com{path.rstrip('/') or '/'}"
+    else:
+        canonical = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}"
+
+    if params:
+        canonical += '?' + urlencode(sorted(params))
+    return f"url:{canonical}", canonical
@@ -0,0 +1,86 @@
+"""
+Event-driven page waits used instead of fixed time.sleep() calls
+"""
+import time
+from selenium.common.exceptions import JavascriptException, TimeoutException
+
+# The full-size photo in Facebook's photo viewer
+MEDIA_IMAGE_SELECTOR = "img[data-visualcompletion='media-vc-image'], img[class*='i09qtzwb']"
+
+# Resolves as soon as the selector matches an <img> with a src, when the DOM has
+# been quiet for quietMs, or when the deadline passes - whichever comes first.
+_WAIT_SCRIPT = """
+var selector = arguments[0], quietMs = arguments[1], timeoutMs = arguments[2];
+var done = arguments[arguments.length - 1];
+var finished = false, observer = null, quietTimer = null, deadlineTimer = null;
+
+function finish(reason, src) {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(deadlineTimer);
+    done({reason: reason, src: src || null});
+}
+
+function check() {
+    if (!selector) return false;
+    var img = document.querySelector(selector);
+    var src = img && (img.currentSrc || img.src);
+    if (src) {
+        finish('found', src);
+        return true;
+    }
+    return false;
+}
+
+function armQuietTimer() {
+    if (!quietMs) return;
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(function () { finish('settled'); }, quietMs);
+}
+
+if (check()) return;
+observer = new MutationObserver(function () {
+    if (!check()) armQuietTimer();
+});
+observer.observe(document.documentElement || document, {
+    childList: true,
+    subtree: true,
+    attributes: true,
+    attributeFilter: ['src', 'class', 'data-visualcompletion']
+});
+armQuietTimer();
+deadlineTimer = setTimeout(function () { finish('timeout'); }, timeoutMs);
+"""
+
+def wait_for_page(driver, selector=MEDIA_IMAGE_SELECTOR, timeout=10, quiet=0.75):
+    """
+    Wait until an image matching selector appears, the DOM settles, or the deadline passes.
+
+    Args:
+        driver: Selenium WebDriver with a page loaded.
+        selector (str): CSS selector of the target image, or None to only wait for the DOM to settle.
+        timeout (float): Maximum number of seconds to wait.
+        quiet (float): Seconds without DOM mutations after which the page counts as settled.
+
+    Returns:
+        dict: 'reason' ('found', 'settled', 'timeout' or 'error'), 'src' of the
+        matched image (or None) and 'elapsed' seconds.
+    """
+    started = time.monotonic()
+    # Leave the script some slack past its own deadline before Selenium gives up
+    driver.set_script_timeout(timeout + 5)
+    try:
+        result = driver.execute_async_script(_WAIT_SCRIPT, selector, int(quiet * 1000), int(timeout * 1000))
+    except (JavascriptException, TimeoutException):
+        # The page navigated away mid-wait or the renderer stalled; let the caller fall back
+        result = None
+    if not result:
+        result = {'reason': 'error', 'src': None}
+    result['elapsed'] = time.monotonic() - started
+    return result
+
+def wait_for_dom_settle(driver, timeout=2, quiet=0.3):
+    """Wait until the DOM stops changing for `quiet` seconds, at most `timeout` seconds"""
+    return wait_for_page(driver, selector=None, timeout=timeout, quiet=quiet)
@@ -1,15 +1,11 @@
 import os
 import sys
-import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import WebDriverException
 from PIL import Image, ImageTk
+from fb_core import get_chrome_driver, wait_for_page, wait_for_dom_settle
 
 class FacebookProfileDownloader:
     def __init__(self):
@@ -20,35 +16,9 @@ class FacebookProfileDownloader:
         
     def setup_driver(self):
         """Setup Chrome driver with options"""
-        chrome_options = Options()
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        # Remove headless mode so we can see what's happening
-        # chrome_options.add_argument("--headless")
-        
         try:
-            # Try to find Chrome executable
-            chrome_paths = [
-                "C:/Program Files/Google/Chrome/Application/chrome.exe",
-                "C:/Program Files (x86)/Google/Chrome/Application/chrome.exe",
-                "C:/Users/%USERNAME%/AppData/Local/Google/Chrome/Application/chrome.exe"
-            ]
-            
-            chrome_executable = None
-            for path in chrome_paths:
-                expanded_path = os.path.expandvars(path)
-                if os.path.exists(expanded_path):
-                    chrome_executable = expanded_path
-                    break
-            
-            if chrome_executable:
-                chrome_options.binary_location = chrome_executable
-                print(f"Found Chrome at: {chrome_executable}")
-            
-            # Try to initialize the driver without webdriver-manager
-            self.driver = webdriver.Chrome(options=chrome_options)
+            # Keep the window visible so we can see what's happening
+            self.driver = get_chrome_driver(headless=False)
             return True
         except Exception as e:
             print(f"Error setting up Chrome driver: {str(e)}")
@@ -66,15 +36,15 @@ class FacebookProfileDownloader:
             print(f"Opening URL: {url}")
             self.driver.get(url)
             
-            # Wait for the page to load
-            time.sleep(5)
+            # Wait for the photo to appear or the page to settle
+            wait_for_page(self.driver, timeout=5)
             
             # Press ESC key to exit photo viewer
             print("Pressing ESC key...")
             webdriver.ActionChains(self.driver).send_keys(Keys.ESCAPE).perform()
             
-            # Wait a moment for the page to adjust
-            time.sleep(2)
+            # Wait for the page to adjust
+            wait_for_dom_settle(self.driver, timeout=2)
             
             # Take a screenshot
             if not os.path.exists("downloads"):
@@ -1,19 +1,8 @@
 import os
-import sys
-import time
-import platform
-import requests
-import uuid
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
+import mimetypes
+import logging
+from fb_core import DownloadFailed, ImageStore, ResultTokens, download_to_store
+from fb_core.config import RESULT_TOKEN_TTL, SECRET_KEY
 from flask import Flask, request, render_template, send_file, jsonify
 from flask_cors import CORS
 
@@ -25,104 +14,32 @@ DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "downlo
 if not os.path.exists(DOWNLOADS_DIR):
     os.makedirs(DOWNLOADS_DIR)
 
-# Global variable to store the last downloaded file path
-last_downloaded_file = None
+# Images are stored once per content hash, so concurrent downloads never overwrite each other
+image_store = ImageStore(os.path.join(DOWNLOADS_DIR, "store"))
+
+# Each download gets its own expiring handle instead of a shared "last file"
+result_tokens = ResultTokens(image_store, SECRET_KEY, max_age=RESULT_TOKEN_TTL)
 
 def download_facebook_profile_picture(url):
     """
-    Download a Facebook profile picture using Selenium in headless mode.
+    Download a Facebook profile picture into the content-addressed image store.
     
     Args:
         url (str): The Facebook photo URL.
     
     Returns:
-        str: Path to the downloaded image or None if failed.
+        dict: The image store record or None if failed.
     """
-    
-    # Set up Chrome options for headless operation
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")  # Run in background
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-    
-    # For Windows, specify the executable path explicitly
-    if platform.system() == "Windows":
-        chrome_options.add_argument("--disable-features=VizDisplayCompositor")
-
-    driver = None
     try:
-        # Try to install and setup ChromeDriver with better error handling
-        try:
-            driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-        except Exception as e:
-            print(f"Error installing ChromeDriver: {str(e)}")
-            # Try alternative approach without webdriver-manager
-            print("Trying alternative approach...")
-            driver = webdriver.Chrome(options=chrome_options)
-        
-        driver.set_page_load_timeout(30)
-        
-        print(f"Opening URL: {url}")
-        driver.get(url)
-        
-        # Wait for the page to load
-        time.sleep(2)
-        
-        # Press ESC key to exit photo viewer
-        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
-        
-        # Wait a moment for the page to adjust
-        time.sleep(2)
-
-        profile_img_url = None
-        try:
-            # Wait for image element
-            wait = WebDriverWait(driver, 10)
-            img_element = wait.until(EC.visibility_of_element_located((By.XPATH, "//img[@data-visualcompletion='media-vc-image'] | //img[contains(@class, 'i09qtzwb')] ")))
-            profile_img_url = img_element.get_attribute('src')
-
-        except Exception as e:
-            print(f"Primary image selector failed. {e}")
-
-        if profile_img_url:
-            print(f"Downloading image from: {profile_img_url}")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            img_response = requests.get(profile_img_url, headers=headers)
-            
-            if img_response.status_code == 200:
-                # Use a fixed filename as requested
-                filename = "Free_FB_Zone_Profile_Picture.png"
-                filepath = os.path.join(DOWNLOADS_DIR, filename)
-                
-                with open(filepath, "wb") as f:
-                    f.write(img_response.content)
-                
-                return filepath
-            else:
-                print(f"ERROR: Failed to download image. Status code: {img_response.status_code}")
-                return None
-        else:
-            print("ERROR: Could not find profile image URL.")
-            return None
-            
-    except WebDriverException as e:
-        print(f"WebDriver error: {str(e)}")
-        if "WinError 193" in str(e):
-            print("This error often occurs due to architecture mismatch between Python and ChromeDriver.")
+        return download_to_store(url, image_store)
+    except DownloadFailed as e:
+        print(f"Download failed: {e.message}")
         return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         if "WinError 193" in str(e):
             print("This error often occurs due to architecture mismatch between Python and ChromeDriver.")
         return None
-    finally:
-        if driver:
-            driver.quit()
 
 @app.route('/')
 def index():
@@ -262,6 +179,7 @@ def index():
                 .then(data => {
                     loading.style.display = 'none';
                     if (data.success) {
+                        downloadUrl = data.download_url;
                         result.className = 'result success';
                         result.innerHTML = `
                             <h3>Download Successful!</h3>
@@ -285,10 +203,13 @@ def index():
                 });
             });
             
+            // Link to the image of the last successful download on this page
+            let downloadUrl = null;
+            
             function downloadImage() {
                 // Create a temporary link and trigger download
                 const link = document.createElement('a');
-                link.href = '/download_file';
+                link.href = downloadUrl;
                 link.download = 'Free_FB_Zone_Profile_Picture.png';
                 document.body.appendChild(link);
                 link.click();
@@ -301,7 +222,6 @@ def index():
 
 @app.route('/download', methods=['POST'])
 def download():
-    global last_downloaded_file
     try:
         data = request.get_json()
         url = data.get('url', '').strip()
@@ -315,13 +235,14 @@ def download():
             pass
         
         # Download the profile picture
-        filepath = download_facebook_profile_picture(url)
+        record = download_facebook_profile_picture(url)
         
-        if filepath and os.path.exists(filepath):
-            # Store the file path for later download
-            last_downloaded_file = filepath
+        if record:
+            token = result_tokens.issue(record)
             return jsonify({
-                'success': True
+                'success': True,
+                'token': token,
+                'download_url': f'/download_file/{token}'
             })
         else:
             return jsonify({
@@ -335,24 +256,26 @@ def download():
             'error': f'An error occurred: {str(e)}'
         }), 500
 
-@app.route('/download_file')
-def download_file():
-    global last_downloaded_file
+@app.route('/download_file/<token>')
+def download_file(token):
     try:
-        # Check if we have a downloaded file
-        if last_downloaded_file and os.path.exists(last_downloaded_file):
+        filepath = result_tokens.resolve(token)
+        if filepath:
+            mimetype = mimetypes.guess_type(filepath)[0] or 'image/png'
+            extension = os.path.splitext(filepath)[1] or '.png'
             return send_file(
-                last_downloaded_file, 
+                filepath, 
                 as_attachment=True, 
-                download_name="Free_FB_Zone_Profile_Picture.png",
-                mimetype='image/png'
+                download_name=f"Free_FB_Zone_Profile_Picture{extension}",
+                mimetype=mimetype
             )
         else:
-            return jsonify({'success': False, 'error': 'No file available for download'}), 404
+            return jsonify({'success': False, 'error': 'Download link is invalid or has expired'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error serving file: {str(e)}'}), 500
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     print("Starting Facebook Profile Picture Downloader Web Server...")
     print("Open your browser and go to http://localhost:5000")
     app.run(host='127.0.0.1', port=5000, debug=False)
\ No newline at end of file
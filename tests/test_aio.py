@@ -0,0 +1,106 @@
+"""
+AsyncChrome lifecycle with a stubbed Chrome process and DevTools websocket
+"""
+import asyncio
+import itertools
+
+import pytest
+
+from fb_core import aio
+
+class FakeStream:
+    def __init__(self):
+        self.lines = [b'DevTools listening on ws://127.0.0.1:9222/devtools/browser/x\n']
+
+    async def readline(self):
+        return self.lines.pop(0) if self.lines else b''
+
+class FakeProcess:
+    """Chrome that takes a while to exit, so a recycle's close() overlaps new jobs"""
+
+    _pids = itertools.count(100000)
+
+    def __init__(self):
+        self.pid = next(self._pids)
+        self.returncode = None
+        self.stderr = FakeStream()
+
+    def terminate(self):
+        self.returncode = 0
+
+    def kill(self):
+        self.returncode = -9
+
+    async def wait(self):
+        await asyncio.sleep(0.2)
+        return self.returncode
+
+class FakeWebSocket:
+    def __init__(self):
+        self._closed = asyncio.Event()
+
+    async def send_str(self, data):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self._closed.wait()
+        raise StopAsyncIteration
+
+    async def close(self):
+        self._closed.set()
+
+class FakeHttpSession:
+    async def ws_connect(self, url, max_msg_size=0):
+        return FakeWebSocket()
+
+class FakeOptions:
+    arguments = ['headless=new']
+
+@pytest.fixture
+def launched(monkeypatch):
+    processes = []
+
+    async def create_subprocess_exec(*args, **kwargs):
+        processes.append(FakeProcess())
+        return processes[-1]
+
+    monkeypatch.setattr(aio, 'discover_chrome', lambda: {
+        'chrome_bin': '/usr/bin/chromium', 'chrome_version': 'fake', 'options': FakeOptions()
+    })
+    monkeypatch.setattr(aio.asyncio, 'create_subprocess_exec', create_subprocess_exec)
+    return processes
+
+def test_start_during_recycle_waits_for_the_relaunch(launched):
+    async def scenario():
+        chrome = aio.AsyncChrome(max_pages=2)
+        http = FakeHttpSession()
+        await chrome.start(http)
+        chrome._recycling = True
+        chrome._recycle_task = asyncio.ensure_future(chrome._recycle())
+        # A job arriving while the old browser is still shutting down
+        await asyncio.sleep(0.05)
+        await chrome.start(http)
+        await asyncio.sleep(0.3)
+        alive, process = chrome.alive, chrome.process
+        await chrome.close()
+        return alive, process
+
+    alive, process = asyncio.run(scenario())
+    assert len(launched) == 2
+    assert alive
+    assert process is launched[1]
+    assert launched[0].returncode is not None
+
+def test_alive_is_false_without_a_process(launched):
+    async def scenario():
+        chrome = aio.AsyncChrome(max_pages=1)
+        await chrome.start(FakeHttpSession())
+        chrome.process = None
+        alive = chrome.alive
+        await chrome.connection.close()
+        return alive
+
+    assert asyncio.run(scenario()) is False
@@ -0,0 +1,81 @@
+"""
+Failure classification of the Selenium path, with a fake Chrome session
+"""
+import pytest
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from fb_core import extractor
+from fb_core.errors import DownloadFailed
+from fb_core.extractor import ExtractionEngine, FAILURE_MESSAGES, _xpath_strategy
+
+class FakeDriver:
+    """A healthy session that ended up on a page without the photo"""
+
+    def __init__(self, current_url, text):
+        self.current_url = current_url
+        self.text = text
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, value):
+        raise NoSuchElementException(value)
+
+    def execute_script(self, script, *args):
+        return [self.current_url, self.text]
+
+class SlowDriver(FakeDriver):
+    """A healthy session whose page never finishes loading"""
+
+    def get(self, url):
+        raise TimeoutException('timeout: Timed out receiving message from renderer')
+
+class FakePool:
+    def __init__(self, driver):
+        self.driver = driver
+        self.released = []
+
+    def acquire(self, timeout=None):
+        return self.driver
+
+    def release(self, driver, discard=False):
+        self.released.append(discard)
+
+@pytest.fixture(autouse=True)
+def short_waits(monkeypatch):
+    monkeypatch.setattr(extractor, 'WebDriverWait', lambda driver, timeout: WebDriverWait(driver, 0.1))
+
+def run_xpath(driver):
+    pool = FakePool(driver)
+    engine = ExtractionEngine(pool)
+    engine.register('xpath', needs_browser=True)(_xpath_strategy)
+    with pytest.raises(DownloadFailed) as failure:
+        engine.run('https://www.facebook.com/photo/?fbid=1')
+    return failure.value, pool
+
+@pytest.mark.parametrize('current_url, text, cause', [
+    ('https://www.facebook.com/login/?next=photo', 'Log in to Facebook', 'login_required'),
+    ('https://www.facebook.com/photo/?fbid=1', "This content isn't available right now", 'unavailable'),
+    ('https://www.facebook.com/photo/?fbid=1', 'A photo page', 'image_not_found')
+])
+def test_missing_photo_is_classified(current_url, text, cause):
+    failure, pool = run_xpath(FakeDriver(current_url, text))
+    assert failure.cause == cause
+    assert failure.message == FAILURE_MESSAGES[cause]
+
+def test_missing_photo_keeps_the_session():
+    failure, pool = run_xpath(FakeDriver('https://www.facebook.com/login/', ''))
+    assert pool.released == [False]
+
+@pytest.mark.parametrize('current_url, text, cause', [
+    ('https://www.facebook.com/login/', 'Log in to Facebook', 'login_required'),
+    ('https://www.facebook.com/photo/?fbid=1', '', 'page_timeout')
+])
+def test_navigation_timeout_keeps_the_session(current_url, text, cause):
+    failure, pool = run_xpath(SlowDriver(current_url, text))
+    assert failure.cause == cause
+    assert pool.released == [False]
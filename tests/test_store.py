@@ -0,0 +1,53 @@
+"""
+Image store index keys and pruning
+"""
+import os
+import time
+
+from fb_core.cache import ResultCache
+from fb_core.store import ImageStore
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 64
+
+def age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+def test_index_ignores_fbcdn_signature(tmp_path):
+    store = ImageStore(str(tmp_path))
+    record = store.save_bytes(PNG)
+    store.remember('https://scontent-a.xx.fbcdn.net/v/t1/123_7_n.png?oh=aaa&oe=111', record)
+    found = store.lookup('https://scontent-b.xx.fbcdn.net/v/t1/123_7_n.png?oh=bbb&oe=222')
+    assert found['sha256'] == record['sha256']
+    assert len(os.listdir(store.index_dir)) == 1
+
+def test_prune_deletes_only_old_unreferenced_images(tmp_path):
+    store = ImageStore(str(tmp_path))
+    cached = store.save_bytes(PNG)
+    orphan = store.save_bytes(PNG + b'orphan')
+    indexed = store.save_bytes(PNG + b'indexed')
+    store.remember('https://example.com/indexed.png', indexed)
+    for record in (cached, orphan, indexed):
+        age(store.absolute_path(record), 7200)
+
+    assert store.prune(3600, keep={cached['sha256']}) == 1
+    assert not os.path.exists(store.absolute_path(orphan))
+    assert os.path.exists(store.absolute_path(cached))
+    assert os.path.exists(store.absolute_path(indexed))
+
+def test_cache_prune_releases_expired_images(tmp_path):
+    store = ImageStore(str(tmp_path / 'store'))
+    cache = ResultCache(store, str(tmp_path / 'results'), ttl=3600, max_entries=8, max_disk_entries=8)
+    record = store.save_bytes(PNG)
+    store.remember('https://example.com/photo.png', record)
+    cache.put('photo:1', record)
+    cache.prune()
+    assert os.path.exists(store.absolute_path(record))
+
+    for directory in (store.index_dir, cache.directory):
+        for name in os.listdir(directory):
+            age(os.path.join(directory, name), 7200)
+    age(store.absolute_path(record), 7200)
+    cache.prune()
+    assert not os.path.exists(store.absolute_path(record))
+    assert os.listdir(store.index_dir) == []